@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import database
+
+def _timed(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1_000_000
+
+def _legacy_get_state(key):
+    # The pre-pool implementation: one connection per call.
+    conn = sqlite3.connect(database.DB_NAME)
+    c = conn.cursor()
+    c.execute("SELECT value FROM state WHERE key=?", (key,))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def _legacy_set_state(key, value):
+    conn = sqlite3.connect(database.DB_NAME)
+    c = conn.cursor()
+    c.execute("REPLACE INTO state (key,value) VALUES (?,?)", (key, value))
+    conn.commit()
+    conn.close()
+
+def bench_state(iterations=2000):
+    """
+    Compares get_state/set_state on a fresh connection per call with the
+    shared connection and the write-behind StateStore in database.py.
+    """
+    results = {
+        "legacy get_state": _timed(lambda i: _legacy_get_state("daily_post_count"), iterations),
+        "legacy set_state": _timed(lambda i: _legacy_set_state("daily_post_count", str(i)), iterations),
+        "cached get_state": _timed(lambda i: database.get_state("daily_post_count"), iterations),
+        "write-through set_state": _timed(lambda i: database.set_state("daily_post_count", str(i), durable=True), iterations),
+        "write-behind set_state": _timed(lambda i: database.set_state("daily_post_count", str(i)), iterations),
+    }
+    start = time.perf_counter()
+    database.flush_state()
+    results["flush"] = (time.perf_counter() - start) * 1_000_000
+    print(f"state ({iterations} calls each)")
+    for name, usec in results.items():
+        print(f"  {name:<26} {usec:10.1f} us")
+
+def _legacy_add_prompt_example(role, content, style="tweet"):
+    conn = sqlite3.connect(database.DB_NAME)
+    c = conn.cursor()
+    c.execute("INSERT INTO prompt_examples (role, content, style) VALUES (?, ?, ?)", (role, content, style))
+    conn.commit()
+    conn.close()
+
+def _synthetic_articles(count, prefix):
+    return [{
+        "title": f"{prefix} headline {i}",
+        "description": f"Synthetic description for article {i} about bitcoin, ether and market moves.",
+        "url": f"https://news.example/{prefix}/{i}",
+        "url_key": f"https://news.example/{prefix}/{i}",
+        "source": "Example",
+        "published_at": f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z",
+    } for i in range(count)]
+
+def _example(article):
+    return ("assistant", f"{article['title']}\n{article['description']}\n@bench", "tweet")
+
+def bench_ingest(count=10000):
+    """
+    Ingests `count` synthetic articles through the old per-row
+    add_prompt_example path, the per-row path on the shared connection, and
+    the bulk path used by news.store_articles (one transaction).
+    """
+    results = {}
+
+    articles = _synthetic_articles(count, "legacy")
+    start = time.perf_counter()
+    for article in articles:
+        _legacy_add_prompt_example(*_example(article))
+    results["legacy per-row"] = time.perf_counter() - start
+
+    articles = _synthetic_articles(count, "pooled")
+    start = time.perf_counter()
+    for article in articles:
+        if database.add_news_articles([article], query="bench"):
+            database.add_prompt_example(*_example(article))
+    results["pooled per-row"] = time.perf_counter() - start
+
+    articles = _synthetic_articles(count, "bulk")
+    start = time.perf_counter()
+    with database.transaction():
+        new_articles = database.add_news_articles(articles, query="bench")
+        database.add_prompt_examples(_example(article) for article in new_articles)
+    results["bulk transaction"] = time.perf_counter() - start
+
+    print(f"ingest ({count} articles)")
+    for name, seconds in results.items():
+        print(f"  {name:<26} {seconds * 1000:10.1f} ms")
+
+BENCHMARKS = {
+    "state": bench_state,
+    "ingest": bench_ingest,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        database.init_db()
+        database.set_state("daily_post_count", "0")
+        for name in names:
+            BENCHMARKS[name]()
+        database.flush_state()
+        database.close_db()
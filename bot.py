@@ -3,28 +3,45 @@ import time
 import random
 import json
 import logging
-import requests
 import tempfile
 import tweepy
-import re
+import requests
 from dotenv import load_dotenv
-from news import fetch_latest_crypto_news_cached
-from utils import generate_tweet_from_news, ask_openai, generate_text, generate_image, download_image
+from news import best_crypto_news_article, best_crypto_news_articles
+from http_cache import cached_get_checked
+from utils import generate_tweet_from_news, ask_openai, generate_text, generate_texts, generate_image, download_image
+from content_inventory import take_draft
+import pipeline
+import resilience
+from resilience import CircuitOpen, DeadlineExceeded
+from url_validator import has_invalid_url
+from price_service import get_prices
+from near_duplicates import is_near_duplicate_tweet, remember_posted_tweet
 from database import (
     get_state,
     set_state,
     add_recent_topic,
-    get_recent_topics,
+    is_recent_topic,
     set_json_state,
     get_json_state,
+    cache_tweets,
+    pop_cached_tweet,
+    get_cached_tweets,
+    cache_users,
+    get_cached_users,
     add_pending_tweet,
-    get_pending_tweets,
-    remove_pending_tweet,
-    increment_retry_count,
+    lease_pending_tweets,
+    complete_pending_tweet,
+    release_pending_tweet,
+    retry_pending_tweet,
     is_duplicate_tweet,
-    add_posted_tweet
+    claim_tweet,
+    release_tweet,
+    mark_news_article_tweeted,
+    get_content_draft_values
 )
-from ratelimit import limits, sleep_and_retry
+from post_budget import spends_post_slot, reserve_post_slot, release_post_slot
+from rate_limiter import try_acquire, available, wait_time, update_from_headers
 
 load_dotenv()
 
@@ -35,7 +52,7 @@ TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN")
 TWITTER_ACCESS_SECRET = os.getenv("TWITTER_ACCESS_SECRET")
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 USER_HANDLE = os.getenv("USER_HANDLE")
-MAX_POSTS_PER_DAY = int(os.getenv("MAX_POSTS_PER_DAY", "10"))
+PENDING_DRAIN_BATCH = int(os.getenv("PENDING_DRAIN_BATCH", "5"))
 
 ONE_HOUR = 60 * 60
 
@@ -54,7 +71,7 @@ auth = tweepy.OAuth1UserHandler(
     TWITTER_ACCESS_TOKEN,
     TWITTER_ACCESS_SECRET
 )
-api = tweepy.API(auth, wait_on_rate_limit=True, timeout=10)
+api = tweepy.API(auth, wait_on_rate_limit=False, timeout=10)
 
 def get_my_user_id():
     user_id = get_state("user_id")
@@ -62,66 +79,67 @@ def get_my_user_id():
         logging.debug("User ID found in DB, no request needed.")
         return user_id
 
+    if not try_acquire("twitter_users"):
+        logging.info("Twitter user lookup rate limit reached, skipping.")
+        return None
     logging.debug("Fetching my user id from Twitter...")
     try:
-        user = client.get_user(username=USER_HANDLE.strip("@"))
+        user = resilience.call("twitter", client.get_user, username=USER_HANDLE.strip("@"))
         if user.data:
             logging.debug(f"My user id: {user.data.id}")
             set_state("user_id", str(user.data.id))
             return str(user.data.id)
         else:
             logging.error("Failed to fetch my user id (no data returned).")
-    except tweepy.TooManyRequests:
+    except tweepy.TooManyRequests as e:
+        update_from_headers("twitter_users", e.response.headers)
         logging.warning("Rate limit exceeded while fetching user id, skipping.")
-    except tweepy.TweepyException as e:
+    except (tweepy.TweepyException, requests.RequestException, CircuitOpen, DeadlineExceeded) as e:
         logging.error(f"Error fetching user id: {e}")
     return None
 
-def get_daily_post_count():
-    val = get_state("daily_post_count")
-    return int(val) if val else 0
-
-def set_daily_post_count(count):
-    set_state("daily_post_count", str(count))
-
-def increment_post_count():
-    count = get_daily_post_count()
-    count += 1
-    set_daily_post_count(count)
-    return count
-
-def can_post():
-    # Check daily limit
-    count = get_daily_post_count()
-    return count < MAX_POSTS_PER_DAY
-
+@spends_post_slot
 def tweet_latest_crypto_news():
-    if not can_post():
-        logging.info("Daily limit reached, skipping tweet_latest_crypto_news.")
-        return
-    news_articles = fetch_latest_crypto_news_cached(api_key=NEWS_API_KEY, user_handle=USER_HANDLE, page_size=5)
-    if not news_articles:
-        logging.debug("No new articles to tweet.")
-        return
-    article = news_articles[0]
-    tweet_text = generate_tweet_from_news(article)
-    if not tweet_text:
-        return
-    if is_duplicate_tweet(tweet_text):
-        logging.info("Duplicate tweet detected. Skipping this article.")
-    post_id = post_tweet_with_media(tweet_text)
+    draft = take_draft("news")
+    if draft:
+        post_id = post_draft(draft)
+    else:
+        article = best_crypto_news_article(api_key=NEWS_API_KEY, user_handle=USER_HANDLE, page_size=5)
+        if not article:
+            logging.debug("No new articles to tweet.")
+            return
+        tweet_text = generate_tweet_from_news(article)
+        if not tweet_text:
+            return
+        post_id = post_tweet_with_media(tweet_text)
+        draft = {"text": tweet_text, "article_key": article["url_key"]}
     if post_id:
-        add_posted_tweet(tweet_text)
-        increment_post_count()
-        logging.info(f"Successfully tweeted: {tweet_text}")
+        mark_news_article_tweeted(draft["article_key"])
+        logging.info(f"Successfully tweeted: {draft['text']}")
+    return post_id
+
+def compose_news_drafts(count):
+    articles = best_crypto_news_articles(
+        api_key=NEWS_API_KEY, user_handle=USER_HANDLE, page_size=5, count=count,
+        exclude=get_content_draft_values("news", "article_key")
+    )
+    drafts = []
+    for article in articles:
+        text = generate_tweet_from_news(article)
+        if text:
+            drafts.append({"text": text, "article_key": article["url_key"]})
+    return drafts
 
 def upload_media(image_data):
+    if not try_acquire("twitter_media"):
+        logging.warning("Media upload rate limit reached, skipping upload.")
+        return None
     try:
         with tempfile.NamedTemporaryFile(delete=True, suffix=".jpg") as tmp_file:
             tmp_file.write(image_data)
             tmp_file.flush()
             logging.debug(f"Uploading media from temporary file: {tmp_file.name}")
-            media = api.media_upload(filename=tmp_file.name)
+            media = resilience.call("twitter", api.media_upload, filename=tmp_file.name)
             logging.info(f"Media uploaded with media_id: {media.media_id}")
             return media.media_id
     except Exception as e:
@@ -129,41 +147,79 @@ def upload_media(image_data):
     return None
 
 def is_invalid_tweet(text: str) -> bool:
-    # Regular expression to find URLs
-    url_pattern = r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
-    urls = re.findall(url_pattern, text)
-    
-    if not urls:
-        # No URLs found, so it's valid
-        return False
+    # Invalid if any URL in the text does not answer 200; verdicts are cached per URL
+    return has_invalid_url(text)
+
+def _post_delay():
+    """
+    Returns how long a tweet must wait for the twitter_post bucket or the
+    Twitter circuit, or None if it can be posted now.
+    """
+    if not available("twitter_post"):
+        logging.warning("Tweet rate limit reached, storing tweet for later.")
+        return wait_time("twitter_post")
+    if not resilience.available("twitter"):
+        logging.warning("Twitter circuit is open, storing tweet for later.")
+        return resilience.breaker("twitter").retry_in()
+    return None
 
-    for url in urls:
-        try:
-            response = requests.head(url, timeout=5)  # Use HEAD request for efficiency
-            if response.status_code != 200:
-                return True  # Invalid if any URL doesn't return 200
-        except requests.RequestException:
-            return True  # Invalid if any request fails
-    
-    return False  # Valid if all URLs return 200
-    
-@sleep_and_retry
-@limits(calls=17, period=ONE_HOUR * 24)  # 17 calls per 24 hours
-def post_tweet_with_media(text: str, image_url=None):
-    logging.debug(f"Preparing to post tweet: {text} with image: {image_url}")
-    if not text:
-        logging.error("No text provided for tweet.")
-        return None
-    if is_duplicate_tweet(text):
+def _passes_checks(text):
+    """
+    Runs the duplicate and URL checks and claims the text. Returns False if
+    the tweet must not be posted.
+    """
+    if is_near_duplicate_tweet(text):
+        logging.warning("Near-duplicate of a recent tweet detected. Skipping posting.")
+        return False
+    if not claim_tweet(text):
         logging.warning("Duplicate tweet detected. Skipping posting.")
-        return None
+        return False
     if is_invalid_tweet(text):
         logging.warning("Invalid tweet detected. Skipping posting.")
+        release_tweet(text)
+        return False
+    return True
+
+def post_tweet_with_media(text: str, image_url=None, image_data=None, image_step=None):
+    """
+    Posts a tweet, attaching image_data, image_url or the image produced by
+    a running pipeline `image_step`. The checks run while image_step is
+    still working; it is cancelled if they fail. Tweets that are rate
+    limited or fail to post are queued in pending_tweets with the image
+    bytes, since generated image URLs expire.
+    """
+    if not text:
+        logging.error("No text provided for tweet.")
+        return None
+    logging.debug(f"Preparing to post tweet: {text} with image: {bool(image_url or image_data) or image_step is not None}")
+    delay = _post_delay()
+    if delay is None and not _passes_checks(text):
+        if image_step:
+            image_step.cancel()
         return None
 
+    if image_step:
+        image = image_step.result(default={}) or {}
+        image_url = image_url or image.get("image_url")
+        image_data = image_data or image.get("image_data")
+
+    tweet_id = None
+    if delay is None:
+        tweet_id, _, delay = _publish(text, image_url, image_data)
+    if tweet_id is None:
+        add_pending_tweet(text, image_url, delay=delay or 0, image_data=image_data)
+    return tweet_id
+
+def _publish(text, image_url=None, image_data=None):
+    """
+    Uploads the image, if any, and posts a checked and claimed tweet.
+    Returns (tweet_id, error, retry_delay). On failure the claim is released,
+    `error` says why and retry_delay is set when Twitter asked us to wait
+    rather than rejecting the tweet.
+    """
     media_ids = []
-    if image_url:
-        img_data = download_image(image_url)
+    if image_url or image_data:
+        img_data = image_data or download_image(image_url)
         if img_data:
             media_id = upload_media(img_data)
             if media_id:
@@ -173,59 +229,106 @@ def post_tweet_with_media(text: str, image_url=None):
         else:
             logging.warning("Failed to download image, posting tweet without image.")
 
+    retry_delay = None
     try:
-        resp = client.create_tweet(text=text, media_ids=media_ids if media_ids else None)
-        if resp.data:
-            tweet_id = resp.data['id']
-            logging.info(f"Posted tweet {tweet_id} -> {text}, image attached: {bool(media_ids)}")
-            add_posted_tweet(text)
-            return tweet_id
+        if not try_acquire("twitter_post"):
+            logging.warning("Tweet rate limit bucket is empty, storing tweet for retry.")
+            error = "rate limited"
+            retry_delay = wait_time("twitter_post")
         else:
+            # Not idempotent: a retry after a timeout may post the tweet twice.
+            resp = resilience.call(
+                "twitter", client.create_tweet, text=text, media_ids=media_ids if media_ids else None, attempts=1
+            )
+            if resp.data:
+                tweet_id = resp.data['id']
+                logging.info(f"Posted tweet {tweet_id} -> {text}, image attached: {bool(media_ids)}")
+                remember_posted_tweet(text)
+                return tweet_id, None, None
+            error = "no data in response"
             logging.error("Error posting tweet (no data in response).")
-            add_pending_tweet(text, image_url)
-    except tweepy.TooManyRequests:
+    except tweepy.TooManyRequests as e:
         logging.warning("Rate limit exceeded while posting tweet, storing tweet for retry.")
-        add_pending_tweet(text, image_url)
-    except tweepy.TweepyException as e:
+        update_from_headers("twitter_post", e.response.headers)
+        error = "rate limited"
+        retry_delay = wait_time("twitter_post")
+    except CircuitOpen as e:
+        logging.warning(f"Not posting tweet: {e} Storing tweet for retry.")
+        error = str(e)
+        retry_delay = e.retry_in
+    except (tweepy.TweepyException, requests.RequestException, DeadlineExceeded) as e:
+        # tweepy.Client does not wrap connection errors from requests.
         logging.error(f"Error posting tweet: {e}")
-        add_pending_tweet(text, image_url)
-    return None
-
-def process_pending_tweets():
-    pending = get_pending_tweets()
+        error = str(e) or type(e).__name__
+    release_tweet(text)
+    return None, error, retry_delay
+
+def process_pending_tweets(batch_size=PENDING_DRAIN_BATCH):
+    """
+    Drains ready pending tweets, posting as many as the daily budget, the
+    twitter_post bucket and the Twitter circuit allow in one pass; the rest
+    go back to the queue without using a retry. Returns the number of
+    tweets posted.
+    """
+    pending = lease_pending_tweets(limit=batch_size)
     if not pending:
-        logging.debug("No pending tweets to process.")
-        return
-
-    logging.info(f"There are {len(pending)} pending tweet(s). Processing the first one.")
-
-    tweet = pending[0]
-    tweet_id = tweet["id"]
-    text = tweet["text"]
-    image_url = tweet["image_url"]
-    retry_count = tweet["retry_count"]
-
-    if retry_count >= 5:
-        logging.error(f"Tweet ID {tweet_id} has reached maximum retry attempts. Deleting.")
-        remove_pending_tweet(tweet_id)
-        return
-
-    logging.debug(f"Retrying tweet ID {tweet_id}: {text} with image: {image_url}")
-    success = post_tweet_with_media(text, image_url)
-    if success:
-        logging.info(f"Successfully posted pending tweet ID {tweet_id}.")
-        remove_pending_tweet(tweet_id)
-        # If this was a post that appeared on timeline, increment post count if needed
-        increment_post_count()
-    else:
-        logging.warning(f"Failed to post pending tweet ID {tweet_id}. Incrementing retry count.")
-        increment_retry_count(tweet_id)
+        logging.debug("No pending tweets ready to process.")
+        return 0
+
+    logging.info(f"Leased {len(pending)} pending tweet(s) for processing.")
+    posted = 0
+    for index, tweet in enumerate(pending):
+        tweet_id = tweet["id"]
+        text = tweet["text"]
+        if is_duplicate_tweet(text) or is_near_duplicate_tweet(text):
+            logging.info(f"Pending tweet ID {tweet_id} duplicates a posted tweet. Dropping it.")
+            complete_pending_tweet(tweet)
+            continue
+        if not available("twitter_post") or not resilience.available("twitter"):
+            logging.info("Tweet rate limit reached or Twitter circuit open, returning remaining pending tweets to the queue.")
+            for remaining in pending[index:]:
+                release_pending_tweet(remaining)
+            break
+        if not reserve_post_slot():
+            logging.info("Daily limit reached, returning remaining pending tweets to the queue.")
+            for remaining in pending[index:]:
+                release_pending_tweet(remaining)
+            break
+        if not claim_tweet(text):
+            logging.info(f"Pending tweet ID {tweet_id} was posted meanwhile. Dropping it.")
+            release_post_slot()
+            complete_pending_tweet(tweet)
+            continue
+
+        logging.debug(f"Retrying tweet ID {tweet_id}: {text} with image: {tweet['image_url']}")
+        if is_invalid_tweet(text):
+            logging.warning(f"Pending tweet ID {tweet_id} has an invalid URL.")
+            release_tweet(text)
+            posted_id, error, retry_delay = None, "invalid URL", None
+        else:
+            posted_id, error, retry_delay = _publish(text, tweet["image_url"], tweet["image_data"])
+        if posted_id:
+            logging.info(f"Successfully posted pending tweet ID {tweet_id}.")
+            complete_pending_tweet(tweet)
+            posted += 1
+            continue
+        release_post_slot()
+        if retry_delay is not None:
+            logging.info(f"Twitter asked to wait ({error}), returning remaining pending tweets to the queue.")
+            for remaining in pending[index:]:
+                release_pending_tweet(remaining)
+            break
+        if retry_pending_tweet(tweet, error=error):
+            logging.error(f"Tweet ID {tweet_id} has reached maximum retry attempts ({error}). Moved to dead letters.")
+        else:
+            logging.warning(f"Failed to post pending tweet ID {tweet_id} ({error}). Scheduled for retry with backoff.")
+    return posted
 
 def cached_or_openai_trends():
     trends = get_json_state("cached_trends")
     if not trends:
         prompt = "List 5 currently trending crypto topics as a JSON array of strings."
-        content = ask_openai(prompt, max_tokens=100)
+        content = ask_openai(prompt, max_tokens=100, cache_site="trends")
         try:
             content=content.strip("`").split("\n", 1)[-1]
             parsed = json.loads(content)
@@ -241,16 +344,13 @@ def cached_or_openai_trends():
     return trends
 
 def cached_mentions():
-    mentions = get_json_state("cached_mentions")
-    return mentions if mentions else []
+    return get_cached_tweets("mention")
 
 def cached_user_tweets():
-    tweets = get_json_state("cached_user_tweets")
-    return tweets if tweets else []
+    return get_cached_tweets("user_tweet")
 
 def cached_influencers():
-    infl = get_json_state("cached_influencers")
-    return infl if infl else []
+    return [f"@{username}" for username in get_cached_users("influencer")]
 
 def cached_viral_coins():
     coins = get_json_state("cached_viral_coins")
@@ -258,7 +358,10 @@ def cached_viral_coins():
 
 def fetch_viral_coins():
     try:
-        resp = requests.get("https://api.coingecko.com/api/v3/search/trending", timeout=5)
+        resp = resilience.call(
+            "coingecko", cached_get_checked, "https://api.coingecko.com/api/v3/search/trending",
+            timeout=resilience.call_timeout(5), bucket="coingecko"
+        )
         if resp.status_code == 200:
             data = resp.json()
             coins = [item['item']['name'] for item in data.get('coins', [])]
@@ -271,7 +374,7 @@ def fetch_viral_coins():
         logging.error(f"Error fetching viral coins: {e}")
 
     prompt = "List 5 fictional viral crypto coin names as a JSON array of strings."
-    content = ask_openai(prompt, max_tokens=50)
+    content = ask_openai(prompt, max_tokens=50, cache_site="viral_coins")
     try:
         content=content.strip("`").split("\n", 1)[-1]
         parsed = json.loads(content)
@@ -294,68 +397,72 @@ def cycle_request_type():
     set_state("request_type", current)
     return current
 
+REQUEST_BUCKETS = {
+    "mentions": "twitter_mentions",
+    "user_tweets": "twitter_search",
+    "influencers": "twitter_search",
+}
+
 def perform_single_request(user_id):
     rtype = cycle_request_type()
+    bucket = REQUEST_BUCKETS[rtype]
+    if not try_acquire(bucket):
+        logging.info(f"Rate limit bucket '{bucket}' is empty, skipping the {rtype} request.")
+        return
     logging.info(f"Performing single Twitter request for: {rtype}")
 
     try:
         if rtype == "mentions":
-            res = client.get_users_mentions(id=user_id, max_results=10)
-            data = [m.text for m in res.data] if res.data else []
-            set_json_state("cached_mentions", data)
+            res = resilience.call("twitter", client.get_users_mentions, id=user_id, max_results=10, tweet_fields=["author_id"])
+            data = [(m.id, m.text, m.author_id) for m in res.data] if res.data else []
+            cache_tweets("mention", data)
             if data:
                 set_state("LAST_MENTION_TIME", str(time.time()))
         elif rtype == "user_tweets":
             query = f"from:{USER_HANDLE.strip('@')}"
-            res = client.search_recent_tweets(query=query, max_results=10)
-            data = [t.text for t in res.data] if res.data else []
-            set_json_state("cached_user_tweets", data)
+            res = resilience.call("twitter", client.search_recent_tweets, query=query, max_results=10, tweet_fields=["author_id"])
+            data = [(t.id, t.text, t.author_id) for t in res.data] if res.data else []
+            cache_tweets("user_tweet", data)
         elif rtype == "influencers":
-            res = client.search_recent_tweets(
+            res = resilience.call(
+                "twitter", client.search_recent_tweets,
                 query="crypto influencer -is:retweet",
                 max_results=10,
                 expansions=["author_id"],
                 user_fields=["username"]
             )
             if res.data and res.includes and 'users' in res.includes:
-                usernames = [user.username for user in res.includes['users']]
-                influencer_handles = [f"@{username}" for username in usernames]
-                set_json_state("cached_influencers", influencer_handles)
-                logging.debug(f"Cached influencers: {influencer_handles}")
-            else:
-                set_json_state("cached_influencers", [])
-    except tweepy.TooManyRequests:
+                users = [(user.id, user.username) for user in res.includes['users']]
+                cache_users("influencer", users)
+                logging.debug(f"Cached influencers: {[username for _, username in users]}")
+    except tweepy.TooManyRequests as e:
         logging.warning("Rate limit exceeded during perform_single_request, skipping this cycle.")
+        update_from_headers(bucket, e.response.headers)
         coins = fetch_viral_coins()
         logging.info(f"Using viral coins fallback: {coins}")
-    except tweepy.TweepyException as e:
+    except CircuitOpen as e:
+        logging.info(f"Skipping the {rtype} request: {e}")
+    except (tweepy.TweepyException, requests.RequestException, DeadlineExceeded) as e:
         logging.error(f"Error performing single request: {e}")
         coins = fetch_viral_coins()
         logging.info(f"Using viral coins fallback: {coins}")
 
+@spends_post_slot
 def reply_to_cached_mentions():
-    if not can_post():
-        logging.info("Daily limit reached, skipping reply_to_cached_mentions.")
-        return
-    mentions = cached_mentions()
-    if not mentions:
+    mention_text = pop_cached_tweet("mention")
+    if not mention_text:
         logging.debug("No cached mentions to reply to.")
         return
-    mention_text = mentions.pop(0)
-    set_json_state("cached_mentions", mentions)
     prompt = f"Reply to this crypto tweet: '{mention_text}'. Add value and positivity."
     reply_text = generate_text(prompt, style="reply")
     if not reply_text:
         return
     post_id = post_tweet_with_media(reply_text)
-    if post_id:
-        increment_post_count()  # Count replies as posts too if desired
     logging.info("Replied to one cached mention.")
+    return post_id
 
+@spends_post_slot
 def proactive_engagement_if_no_mentions():
-    if not can_post():
-        logging.info("Daily limit reached, skipping reply_to_cached_mentions.")
-        return
     logging.info("Performing proactive engagement.")
     infl = cached_influencers()
     influencer_name = random.choice(infl) if infl else USER_HANDLE
@@ -366,60 +473,97 @@ def proactive_engagement_if_no_mentions():
 
     meme_coin = random.choice(coins) if coins else "#CryptoGem"
 
+    # The image only depends on the coin and influencer, so it is generated
+    # while the text is written.
+    image = pipeline.submit(
+        "image", draft_image, f"A cryptocurrency themed image related to {meme_coin} and {influencer_name}"
+    )
     prompt = f"No mentions lately. Tweet about {meme_coin} and give a shoutout to {influencer_name}."
-    text = generate_text(prompt, style="tweet")
+    text = pipeline.submit("text", generate_text, prompt, style="tweet").result()
     if not text:
+        image.cancel()
         return
-    image_url = generate_image(f"A cryptocurrency themed image related to {meme_coin} and {influencer_name}")
-    post_id = post_tweet_with_media(text, image_url=image_url)
-    if post_id:
-        increment_post_count()
+    post_id = post_tweet_with_media(text, image_step=image)
+    return post_id
+
+TREND_INFO_FALLBACK = "Stay tuned for the latest updates on this cryptocurrency!"
+
+def fetch_trend_info(crypto_topic, candidates=()):
+    # Reads the price cache kept warm by the PriceRefresher; on a miss, one
+    # batched /simple/price request also prices the other candidates.
+    usd = get_prices([crypto_topic, *candidates]).get(crypto_topic)
+    if usd is None:
+        logging.error(f"No CoinGecko price for {crypto_topic}.")
+        return TREND_INFO_FALLBACK
+    return f"The current price of {crypto_topic} is ${usd}."
+
+def price_watchlist():
+    """
+    Topics whose prices the background refresher keeps warm: the cached
+    trends and viral coins. Never asks OpenAI.
+    """
+    return [*(get_json_state("cached_trends") or []), *cached_viral_coins()]
+
+def compose_trend_text(crypto_topic, candidates=()):
+    verified_info = pipeline.submit("price", fetch_trend_info, crypto_topic, candidates).result(default=TREND_INFO_FALLBACK)
+    prompt = f"Write a short, insightful tweet about '{crypto_topic}'. Incorporate the following verified information: '{verified_info}'."
+    return pipeline.submit("text", generate_text, prompt, style="tweet").result()
+
+def compose_trend_post(crypto_topic, candidates=()):
+    """
+    Starts the topic's image, then fetches the price and writes the text
+    while it renders. Returns (text, image_step); the step is cancelled and
+    text is None if writing failed.
+    """
+    image = pipeline.submit("image", draft_image, trend_image_prompt(crypto_topic))
+    text = compose_trend_text(crypto_topic, candidates)
+    if not text:
+        image.cancel()
+    return text, image
 
-def tweet_about_crypto_trend():
-    if not can_post():
-        logging.info("Daily limit reached, skipping tweet_about_crypto_trend.")
-        return
+def trend_image_prompt(crypto_topic):
+    return f"An illustration representing {crypto_topic}"
+
+def available_trend_topics(exclude=()):
     trends = cached_or_openai_trends()
     if not trends:
         logging.debug("No trends found.")
-        return
-
-    recent_topics = get_recent_topics(limit=100)
-    available_trends = [topic for topic in trends if topic not in recent_topics]
-
-    if not available_trends:
-        logging.warning("No new trends available to post.")
-        return
-
-    crypto_topic = random.choice(available_trends)
-    try:
-        response = requests.get(f"https://api.coingecko.com/api/v3/coins/{crypto_topic.lower()}", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            current_price = data.get('market_data', {}).get('current_price', {}).get('usd', 'N/A')
-            verified_info = f"The current price of {crypto_topic} is ${current_price}."
-        else:
-            logging.error(f"Failed to fetch data for {crypto_topic} from CoinGecko.")
-            verified_info = "Stay tuned for the latest updates on this cryptocurrency!"
-    except Exception as e:
-        logging.error(f"Error fetching crypto data: {e}")
-        verified_info = "Stay tuned for the latest updates on this cryptocurrency!"
+        return []
+    return [topic for topic in trends if not is_recent_topic(topic) and topic not in exclude]
 
-    prompt = f"Write a short, insightful tweet about '{crypto_topic}'. Incorporate the following verified information: '{verified_info}'."
-    tweet_text = generate_text(prompt, style="tweet")
-    if not tweet_text:
-        return
-    image_url = generate_image(f"An illustration representing {crypto_topic}")
-    post_id = post_tweet_with_media(tweet_text, image_url=image_url)
+@spends_post_slot
+def tweet_about_crypto_trend():
+    draft = take_draft("trend", lambda d: not is_recent_topic(d["topic"]))
+    if draft:
+        post_id = post_draft(draft)
+        crypto_topic = draft["topic"]
+    else:
+        available_trends = available_trend_topics()
+        if not available_trends:
+            logging.warning("No new trends available to post.")
+            return
+
+        crypto_topic = random.choice(available_trends)
+        tweet_text, image = compose_trend_post(crypto_topic, available_trends)
+        if not tweet_text:
+            return
+        post_id = post_tweet_with_media(tweet_text, image_step=image)
     if post_id:
         add_recent_topic(crypto_topic)
-        increment_post_count()
-        add_recent_topic(crypto_topic)
+    return post_id
 
-def promote_account():
-    if not can_post():
-        logging.info("Daily limit reached, skipping promote_account.")
-        return
+def compose_trend_drafts(count):
+    topics = available_trend_topics(exclude=get_content_draft_values("trend", "topic"))
+    drafts = []
+    for crypto_topic in random.sample(topics, min(count, len(topics))):
+        text, image = compose_trend_post(crypto_topic, topics)
+        if text:
+            drafts.append(dict(image.result(default={}) or {}, text=text, topic=crypto_topic))
+    return drafts
+
+PROMO_IMAGE_PROMPT = "A crypto marketing themed illustration"
+
+def promo_prompt():
     user_tweets = cached_user_tweets()
     influencer_tweets = cached_influencers()
     news_snippet = ""
@@ -427,29 +571,57 @@ def promote_account():
         news_snippet = f"Check out these influencer vibes: '{influencer_tweets[0][:60]}...' "
 
     if not user_tweets:
-        prompt = f"Encourage following {USER_HANDLE} for crypto insights. {news_snippet}"
-    else:
-        example_tweet = random.choice(user_tweets)
-        snippet = (example_tweet[:100] + '...') if len(example_tweet) > 100 else example_tweet
-        prompt = (f"Encourage following {USER_HANDLE} for crypto insights. Reference: '{snippet}'. "
-                  f"{news_snippet} Make them excited to follow.")
+        return f"Encourage following {USER_HANDLE} for crypto insights. {news_snippet}"
+    example_tweet = random.choice(user_tweets)
+    snippet = (example_tweet[:100] + '...') if len(example_tweet) > 100 else example_tweet
+    return (f"Encourage following {USER_HANDLE} for crypto insights. Reference: '{snippet}'. "
+            f"{news_snippet} Make them excited to follow.")
 
-    promo_text = generate_text(prompt, style="promo", max_tokens=100)
+@spends_post_slot
+def promote_account():
+    draft = take_draft("promo")
+    if draft:
+        return post_draft(draft)
+    image = pipeline.submit("image", draft_image, PROMO_IMAGE_PROMPT)
+    promo_text = pipeline.submit("text", generate_text, promo_prompt(), style="promo", max_tokens=100).result()
     if not promo_text:
+        image.cancel()
         return
-    image_url = generate_image("A crypto marketing themed illustration")
-    post_id = post_tweet_with_media(promo_text, image_url)
-    if post_id:
-        increment_post_count()
-
+    post_id = post_tweet_with_media(promo_text, image_step=image)
+    return post_id
+
+def compose_promo_drafts(count):
+    # One call with n=count: the variants share the prompt's input tokens.
+    # Their images render on the pipeline pool meanwhile.
+    images = [pipeline.submit("image", draft_image, PROMO_IMAGE_PROMPT) for _ in range(count)]
+    texts = generate_texts(promo_prompt(), n=count, style="promo", max_tokens=100)
+    for image in images[len(texts):]:
+        image.cancel()
+    return [dict(image.result(default={}) or {}, text=text) for text, image in zip(texts, images)]
+
+def draft_image(image_prompt):
+    """
+    Generates and downloads a draft's image up front, since generated image
+    URLs expire. Returns the image fields for the draft dict.
+    """
+    image_url = generate_image(image_prompt)
+    return {"image_url": image_url, "image_data": download_image(image_url) if image_url else None}
+
+def post_draft(draft):
+    logging.info(f"Posting {draft['kind']} draft from the content inventory.")
+    return post_tweet_with_media(draft["text"], image_url=draft.get("image_url"), image_data=draft.get("image_data"))
+
+CONTENT_COMPOSERS = {
+    "news": compose_news_drafts,
+    "trend": compose_trend_drafts,
+    "promo": compose_promo_drafts,
+}
+
+@spends_post_slot
 def retweet_popular_crypto_post():
-    if not can_post():
-        logging.info("Daily limit reached, skipping retweet_popular_crypto_post.")
-        return
     text = generate_text("Write a short commentary on a popular crypto tweet you saw recently", style="tweet")
     if not text:
         return
     post_id = post_tweet_with_media(text)
-    if post_id:
-        increment_post_count()
     logging.info("Simulated retweet by posting a commentary on a popular post.")
+    return post_id
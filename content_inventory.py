@@ -0,0 +1,117 @@
+import os
+import logging
+import threading
+import pipeline
+from database import add_content_drafts, count_content_drafts, take_content_draft
+
+# Each kind is posted only a few times a day, so one ready draft per kind
+# is enough; a kind is refilled only once its draft was taken or missed.
+CONTENT_INVENTORY_TARGET = int(os.getenv("CONTENT_INVENTORY_TARGET", "1"))
+CONTENT_DRAFT_TTL = float(os.getenv("CONTENT_DRAFT_TTL", str(6 * 60 * 60)))
+CONTENT_PRODUCER_INTERVAL = float(os.getenv("CONTENT_PRODUCER_INTERVAL", "300"))
+
+_demand = set()
+_demand_lock = threading.Lock()
+
+def _add_demand(kinds):
+    with _demand_lock:
+        _demand.update(kinds)
+
+def _take_demand():
+    with _demand_lock:
+        kinds = set(_demand)
+        _demand.clear()
+    return kinds
+
+class ContentProducer:
+    """
+    Keeps the content_drafts table stocked with ready-to-post drafts so post
+    tasks only have to dequeue one. `composers` maps a draft kind to a
+    function taking the number of drafts wanted and returning a list of
+    draft dicts (text plus optional image_url, image_data, topic and
+    article_key); it may return fewer. Composers run inside
+    pipeline.background(), so their steps do not compete with post tasks.
+    The background loop skips a round while `active()` returns false, e.g.
+    once the daily post budget is spent.
+    """
+
+    def __init__(self, composers, target=CONTENT_INVENTORY_TARGET, ttl=CONTENT_DRAFT_TTL,
+                 interval=CONTENT_PRODUCER_INTERVAL, active=None):
+        self.composers = composers
+        self.active = active
+        self.target = target
+        self.ttl = ttl
+        self.interval = interval
+        self._stocked = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refill(self):
+        """
+        Tops up to `target` drafts every kind that was taken or asked for
+        since the last round (every kind on the first round), so drafts are
+        produced about as fast as they are posted instead of expiring
+        unused. Returns the number added.
+        """
+        kinds = _take_demand() if self._stocked else set(self.composers)
+        self._stocked = True
+        added = 0
+        for kind, compose in self.composers.items():
+            if kind not in kinds:
+                continue
+            missing = self.target - count_content_drafts(kind)
+            if missing <= 0:
+                continue
+            try:
+                with pipeline.background():
+                    drafts = [dict(draft, kind=kind) for draft in compose(missing)[:missing] if draft.get("text")]
+            except Exception as e:
+                logging.error(f"Error composing {kind} drafts: {e}")
+                drafts = []
+            if len(drafts) < missing:
+                # Try again next round.
+                _add_demand([kind])
+            if drafts:
+                add_content_drafts(drafts, self.ttl)
+                added += len(drafts)
+                logging.info(f"Added {len(drafts)} {kind} drafts to the content inventory.")
+        return added
+
+    def start(self):
+        """
+        Starts a daemon thread that refills the inventory every `interval`
+        seconds, starting immediately.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="content-producer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.active is None or self.active():
+                    self.refill()
+            except Exception as e:
+                logging.error(f"Content producer failed: {e}")
+            self._stop.wait(self.interval)
+
+def take_draft(kind, is_valid=None):
+    """
+    Dequeues the oldest fresh draft of a kind, discarding ones for which
+    `is_valid(draft)` is false (e.g. the topic was posted meanwhile). Either
+    way the producer refills the kind on its next round.
+    """
+    _add_demand([kind])
+    while True:
+        draft = take_content_draft(kind)
+        if draft is None or is_valid is None or is_valid(draft):
+            return draft
+        logging.debug(f"Discarding stale {kind} draft: {draft['text']}")
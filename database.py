@@ -1,94 +1,784 @@
+import os
 import sqlite3
+import logging
 import json
 import hashlib
+import random
+import time
+import uuid
+import atexit
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 
-DB_NAME = "bot_state.db"
+DB_NAME = os.getenv("DB_NAME", "bot_state.db")
+DB_CACHED_STATEMENTS = 256
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "30"))
+STATE_WRITE_THROUGH = os.getenv("STATE_WRITE_THROUGH", "0") == "1"
+RECENT_TOPICS_CAPACITY = int(os.getenv("RECENT_TOPICS_CAPACITY", "100"))
+PROMPT_EXAMPLES_PER_STYLE = int(os.getenv("PROMPT_EXAMPLES_PER_STYLE", "200"))
+TWITTER_CACHE_MAX_AGE = float(os.getenv("TWITTER_CACHE_MAX_AGE", "172800"))
+PENDING_MAX_RETRIES = int(os.getenv("PENDING_MAX_RETRIES", "5"))
+PENDING_BACKOFF_BASE = float(os.getenv("PENDING_BACKOFF_BASE", "60"))
+PENDING_BACKOFF_MAX = float(os.getenv("PENDING_BACKOFF_MAX", "21600"))
+PENDING_LEASE_SECONDS = float(os.getenv("PENDING_LEASE_SECONDS", "300"))
+
+# Pragmas applied once to the shared connection. WAL lets readers in other
+# processes proceed while we write, and NORMAL sync is durable in WAL mode
+# except for the last transaction on power loss.
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA busy_timeout=5000",
+)
+
+_conn = None
+_conn_path = None
+_db_lock = threading.RLock()
+
+def get_connection():
+    """
+    Returns the long-lived connection shared by every helper in this module.
+    The connection is opened lazily and reopened if DB_NAME changes.
+    """
+    global _conn, _conn_path
+    with _db_lock:
+        if _conn is not None and _conn_path != DB_NAME:
+            _conn.close()
+            _conn = None
+        if _conn is None:
+            conn = sqlite3.connect(
+                DB_NAME,
+                timeout=30,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=DB_CACHED_STATEMENTS,
+            )
+            for pragma in DB_PRAGMAS:
+                conn.execute(pragma)
+            _conn = conn
+            _conn_path = DB_NAME
+        return _conn
+
+def close_db():
+    global _conn, _conn_path
+    with _db_lock:
+        if _conn is not None:
+            _conn.close()
+        _conn = None
+        _conn_path = None
+
+atexit.register(close_db)
+
+@contextmanager
+def transaction():
+    """
+    Runs the enclosed statements in a single write transaction on the shared
+    connection. Nested uses join the outer transaction.
+    """
+    with _db_lock:
+        conn = get_connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+def _execute(sql, params=()):
+    with _db_lock:
+        return get_connection().execute(sql, params)
+
+def _fetchone(sql, params=()):
+    with _db_lock:
+        return get_connection().execute(sql, params).fetchone()
+
+def _fetchall(sql, params=()):
+    with _db_lock:
+        return get_connection().execute(sql, params).fetchall()
 
 def get_tweet_hash(text):
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    with transaction() as c:
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS pending_tweets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL,
+            image_url TEXT,
+            retry_count INTEGER DEFAULT 0
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS posted_tweets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tweet_text TEXT NOT NULL,
+            tweet_hash TEXT,
+            posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS prompt_examples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            style TEXT NOT NULL  -- "tweet", "reply", "promo", etc.
+        )
+        """)
+        migrate(c)
+
+def _migrate_posted_tweets_indexes(c):
+    # Older databases could record the same tweet twice; keep the first copy
+    # so the unique index can be built.
     c.execute("""
-    CREATE TABLE IF NOT EXISTS state (
-        key TEXT PRIMARY KEY,
-        value TEXT
+    DELETE FROM posted_tweets
+    WHERE tweet_hash IS NOT NULL AND id NOT IN (
+        SELECT MIN(id) FROM posted_tweets GROUP BY tweet_hash
     )
     """)
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_posted_tweets_hash ON posted_tweets (tweet_hash)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posted_tweets_posted_at ON posted_tweets (posted_at)")
+
+def _migrate_tweet_fingerprints(c):
     c.execute("""
-    CREATE TABLE IF NOT EXISTS recent_topics (
-        topic TEXT PRIMARY KEY
+    CREATE TABLE IF NOT EXISTS tweet_fingerprints (
+        tweet_hash TEXT PRIMARY KEY,
+        signature BLOB NOT NULL,
+        posted_at REAL NOT NULL
     )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tweet_fingerprints_posted_at ON tweet_fingerprints (posted_at)")
     c.execute("""
-    CREATE TABLE IF NOT EXISTS pending_tweets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+    CREATE TABLE IF NOT EXISTS tweet_fingerprint_bands (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        tweet_hash TEXT NOT NULL,
+        PRIMARY KEY (band, bucket, tweet_hash)
+    ) WITHOUT ROWID
+    """)
+
+def _migrate_prompt_examples_style_index(c):
+    c.execute("CREATE INDEX IF NOT EXISTS idx_prompt_examples_style_id ON prompt_examples (style, id)")
+    for (style,) in c.execute("SELECT DISTINCT style FROM prompt_examples").fetchall():
+        _trim_prompt_examples(c, style)
+
+def _migrate_recent_topic_ring(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS recent_topic_ring (
+        slot INTEGER PRIMARY KEY,
+        seq INTEGER NOT NULL,
+        topic_key TEXT NOT NULL,
+        topic TEXT NOT NULL
+    )
+    """)
+    legacy = c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='recent_topics'").fetchone()
+    if not legacy:
+        return
+    rows = c.execute("""
+    SELECT topic FROM (
+        SELECT rowid, topic FROM recent_topics ORDER BY rowid DESC LIMIT ?
+    ) ORDER BY rowid ASC
+    """, (RECENT_TOPICS_CAPACITY,)).fetchall()
+    seen = set()
+    for seq, (topic,) in enumerate(rows):
+        key = normalize_topic(topic)
+        if key in seen:
+            continue
+        seen.add(key)
+        c.execute("REPLACE INTO recent_topic_ring (slot, seq, topic_key, topic) VALUES (?, ?, ?, ?)",
+                  (seq % RECENT_TOPICS_CAPACITY, seq, key, topic))
+    c.execute("DROP TABLE recent_topics")
+
+def _migrate_counters(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0,
+        reset_at REAL
+    )
+    """)
+    # Carry the post budget over from the old state keys.
+    count = c.execute("SELECT value FROM state WHERE key = 'daily_post_count'").fetchone()
+    reset_at = c.execute("SELECT value FROM state WHERE key = 'daily_reset_time'").fetchone()
+    if count or reset_at:
+        c.execute("INSERT OR IGNORE INTO counters (name, value, reset_at) VALUES ('daily_post_count', ?, ?)",
+                  (int(count[0]) if count and count[0] else 0, float(reset_at[0]) if reset_at and reset_at[0] else None))
+
+def _migrate_pending_tweet_queue(c):
+    c.execute("ALTER TABLE pending_tweets ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+    c.execute("ALTER TABLE pending_tweets ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0")
+    c.execute("ALTER TABLE pending_tweets ADD COLUMN lease_token TEXT")
+    c.execute("ALTER TABLE pending_tweets ADD COLUMN last_error TEXT")
+    c.execute("ALTER TABLE pending_tweets ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_pending_tweets_next_attempt ON pending_tweets (next_attempt_at)")
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS dead_letter_tweets (
+        id INTEGER PRIMARY KEY,
         text TEXT NOT NULL,
         image_url TEXT,
-        retry_count INTEGER DEFAULT 0
+        retry_count INTEGER NOT NULL,
+        last_error TEXT,
+        created_at REAL,
+        failed_at REAL NOT NULL
+    )
+    """)
+
+def _migrate_twitter_cache_tables(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS cached_tweets (
+        tweet_id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,  -- "mention", "user_tweet"
+        text TEXT NOT NULL,
+        author_id INTEGER,
+        fetched_at REAL NOT NULL,
+        consumed INTEGER NOT NULL DEFAULT 0
     )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_cached_tweets_kind ON cached_tweets (kind, consumed, tweet_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_cached_tweets_fetched_at ON cached_tweets (fetched_at)")
     c.execute("""
-    CREATE TABLE IF NOT EXISTS posted_tweets (
+    CREATE TABLE IF NOT EXISTS cached_users (
+        user_id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,  -- "influencer"
+        username TEXT NOT NULL,
+        fetched_at REAL NOT NULL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_cached_users_kind ON cached_users (kind, fetched_at)")
+    # The JSON blobs carry no ids to key rows on; the next polls refill the tables.
+    c.execute("DELETE FROM state WHERE key IN ('cached_mentions', 'cached_user_tweets', 'cached_influencers')")
+
+def _migrate_news_articles(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS news_articles (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        tweet_text TEXT NOT NULL,
-        tweet_hash TEXT,
-        posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        url_key TEXT NOT NULL UNIQUE,
+        url TEXT,
+        title TEXT NOT NULL,
+        description TEXT,
+        source TEXT,
+        published_at TEXT,
+        query TEXT,
+        fetched_at REAL NOT NULL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_news_articles_query_published ON news_articles (query, published_at)")
+
+def _migrate_news_articles_tweeted(c):
+    c.execute("ALTER TABLE news_articles ADD COLUMN tweeted_at REAL")
+
+def _migrate_llm_cache(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL
     )
     """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache (expires_at)")
+
+def _migrate_content_drafts(c):
     c.execute("""
-    CREATE TABLE IF NOT EXISTS prompt_examples (
+    CREATE TABLE IF NOT EXISTS content_drafts (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        role TEXT NOT NULL,
-        content TEXT NOT NULL,
-        style TEXT NOT NULL  -- "tweet", "reply", "promo", etc.
+        kind TEXT NOT NULL,
+        text TEXT NOT NULL,
+        image_url TEXT,
+        image_data BLOB,
+        topic TEXT,
+        article_key TEXT,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_content_drafts_kind_expires ON content_drafts (kind, expires_at)")
+
+def _migrate_url_verdicts(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS url_verdicts (
+        url TEXT PRIMARY KEY,
+        host TEXT NOT NULL,
+        ok INTEGER NOT NULL,
+        status INTEGER,
+        checked_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_url_verdicts_expires_at ON url_verdicts (expires_at)")
+
+def _migrate_coin_prices(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS coin_prices (
+        coin_id TEXT PRIMARY KEY,
+        usd REAL,
+        fetched_at REAL NOT NULL
+    )
+    """)
+
+def _migrate_http_cache(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS http_cache (
+        cache_key TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        status INTEGER NOT NULL,
+        headers TEXT,
+        body BLOB,
+        etag TEXT,
+        last_modified TEXT,
+        fetched_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_expires_at ON http_cache (expires_at)")
+
+def _migrate_rate_limits(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        name TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        blocked_until REAL NOT NULL DEFAULT 0
     )
     """)
-    conn.commit()
-    conn.close()
+
+def _migrate_pending_tweet_image_data(c):
+    c.execute("ALTER TABLE pending_tweets ADD COLUMN image_data BLOB")
+    c.execute("ALTER TABLE dead_letter_tweets ADD COLUMN image_data BLOB")
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have run, so append new steps and never reorder existing ones.
+MIGRATIONS = [
+    _migrate_posted_tweets_indexes,
+    _migrate_tweet_fingerprints,
+    _migrate_prompt_examples_style_index,
+    _migrate_recent_topic_ring,
+    _migrate_counters,
+    _migrate_pending_tweet_queue,
+    _migrate_twitter_cache_tables,
+    _migrate_news_articles,
+    _migrate_http_cache,
+    _migrate_rate_limits,
+    _migrate_news_articles_tweeted,
+    _migrate_llm_cache,
+    _migrate_content_drafts,
+    _migrate_url_verdicts,
+    _migrate_coin_prices,
+    _migrate_pending_tweet_image_data,
+]
+
+def migrate(c):
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        logging.info(f"Applying database migration {number}: {step.__name__}")
+        step(c)
+        c.execute(f"PRAGMA user_version = {number}")
+
+class StateStore:
+    """
+    In-memory mirror of the `state` table. Reads are served from memory and
+    writes are buffered until flush(), which commits all dirty keys in one
+    transaction. With write_through=True (or durable=True on a single set)
+    the write reaches the database before set() returns.
+    """
+
+    def __init__(self, write_through=False, flush_interval=STATE_FLUSH_INTERVAL):
+        self.write_through = write_through
+        self.flush_interval = flush_interval
+        self._values = None
+        self._path = None
+        self._dirty = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def _ensure_loaded(self):
+        if self._values is not None and self._path == DB_NAME:
+            return
+        if self._values is not None:
+            self._dirty.clear()
+        rows = _fetchall("SELECT key, value FROM state")
+        self._values = {key: value for key, value in rows}
+        self._path = DB_NAME
+
+    def get(self, key):
+        with self._lock:
+            self._ensure_loaded()
+            return self._values.get(key)
+
+    def set(self, key, value, durable=False):
+        with self._lock:
+            self._ensure_loaded()
+            self._values[key] = value
+            if durable or self.write_through:
+                self._dirty.pop(key, None)
+                _execute("REPLACE INTO state (key,value) VALUES (?,?)", (key, value))
+            else:
+                self._dirty[key] = value
+
+    def flush(self):
+        """
+        Writes every dirty key in a single transaction. Returns the number of
+        keys written.
+        """
+        with self._lock:
+            if not self._dirty:
+                return 0
+            items = list(self._dirty.items())
+            with transaction() as c:
+                c.executemany("REPLACE INTO state (key,value) VALUES (?,?)", items)
+            self._dirty.clear()
+            return len(items)
+
+    def reload(self):
+        with self._lock:
+            self.flush()
+            self._values = None
+            self._ensure_loaded()
+
+    def start_flusher(self):
+        """
+        Starts a daemon thread that flushes dirty keys every flush_interval
+        seconds.
+        """
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="state-flusher", daemon=True)
+        self._flusher.start()
+
+    def stop_flusher(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.flush_interval)
+            self._flusher = None
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.error(f"Error flushing state: {e}")
+
+state_store = StateStore(write_through=STATE_WRITE_THROUGH)
+
+# Runs before close_db (atexit is LIFO) so buffered keys are not lost on exit.
+atexit.register(state_store.flush)
 
 def get_state(key):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT value FROM state WHERE key=?", (key,))
-    row = c.fetchone()
-    conn.close()
+    return state_store.get(key)
+
+def set_state(key, value, durable=False):
+    state_store.set(key, value, durable=durable)
+
+def flush_state():
+    return state_store.flush()
+
+def normalize_topic(topic):
+    """
+    Maps "#Bitcoin", "bitcoin" and " BITCOIN " to the same topic key.
+    """
+    return " ".join(topic.casefold().lstrip("#$").split())
+
+class RecentTopics:
+    """
+    Fixed-capacity ring buffer of recently posted topics. Each insert is one
+    REPLACE into slot seq % capacity, overwriting the oldest entry, and an
+    in-memory mirror answers membership tests without touching SQLite.
+    """
+
+    def __init__(self, capacity=RECENT_TOPICS_CAPACITY):
+        self.capacity = capacity
+        self._topics = None
+        self._path = None
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if self._topics is not None and self._path == DB_NAME:
+            return
+        rows = _fetchall("SELECT seq, topic_key, topic FROM recent_topic_ring ORDER BY seq ASC")
+        self._topics = OrderedDict((key, topic) for _, key, topic in rows)
+        self._next_seq = rows[-1][0] + 1 if rows else 0
+        self._path = DB_NAME
+
+    def add(self, topic, capacity=None):
+        capacity = capacity or self.capacity
+        key = normalize_topic(topic)
+        with self._lock:
+            self._ensure_loaded()
+            if key in self._topics:
+                return
+            seq = self._next_seq
+            with transaction() as c:
+                c.execute("REPLACE INTO recent_topic_ring (slot, seq, topic_key, topic) VALUES (?, ?, ?, ?)",
+                          (seq % capacity, seq, key, topic))
+                if capacity != self.capacity:
+                    c.execute("DELETE FROM recent_topic_ring WHERE slot >= ?", (capacity,))
+            self.capacity = capacity
+            self._next_seq = seq + 1
+            self._topics[key] = topic
+            while len(self._topics) > capacity:
+                self._topics.popitem(last=False)
+
+    def __contains__(self, topic):
+        with self._lock:
+            self._ensure_loaded()
+            return normalize_topic(topic) in self._topics
+
+    def latest(self, limit):
+        with self._lock:
+            self._ensure_loaded()
+            topics = list(self._topics.values())
+        return topics[::-1][:limit]
+
+recent_topics = RecentTopics()
+
+def add_recent_topic(topic, max_limit=RECENT_TOPICS_CAPACITY):
+    recent_topics.add(topic, capacity=max_limit)
+
+def is_recent_topic(topic):
+    return topic in recent_topics
+
+def get_recent_topics(limit=100):
+    return recent_topics.latest(limit)
+
+def get_counter(name):
+    row = _fetchone("SELECT value FROM counters WHERE name = ?", (name,))
+    return row[0] if row else 0
+
+def reserve_counter(name, limit):
+    """
+    Atomically increments the counter if it is below `limit`. Returns the
+    new value, or None if the limit has been reached. Safe across processes
+    sharing the database.
+    """
+    with transaction() as c:
+        c.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (name,))
+        row = c.execute("UPDATE counters SET value = value + 1 WHERE name = ? AND value < ? RETURNING value",
+                        (name, limit)).fetchone()
+    return row[0] if row else None
+
+def release_counter(name):
+    """
+    Gives back one unit taken by reserve_counter.
+    """
+    row = _fetchone("UPDATE counters SET value = MAX(value - 1, 0) WHERE name = ? RETURNING value", (name,))
+    return row[0] if row else 0
+
+def reset_counter_if_due(name, now, next_reset_at):
+    """
+    Zeroes the counter and moves its reset time to `next_reset_at` if its
+    reset time has passed (or was never set). Returns True if this call did
+    the reset, so only one of several processes acts on it.
+    """
+    with transaction() as c:
+        c.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (name,))
+        row = c.execute("""
+        UPDATE counters SET value = 0, reset_at = ?
+        WHERE name = ? AND (reset_at IS NULL OR reset_at <= ?)
+        RETURNING value
+        """, (next_reset_at, name, now)).fetchone()
+    return row is not None
+
+def cache_tweets(kind, tweets):
+    """
+    Upserts (tweet_id, text, author_id) tuples fetched from Twitter. Tweets
+    seen in an earlier poll keep their consumed flag. Rows older than
+    TWITTER_CACHE_MAX_AGE are pruned.
+    """
+    now = time.time()
+    with transaction() as c:
+        c.executemany("""
+        INSERT INTO cached_tweets (tweet_id, kind, text, author_id, fetched_at) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (tweet_id) DO UPDATE SET fetched_at = excluded.fetched_at
+        """, [(int(tweet_id), kind, text, author_id, now) for tweet_id, text, author_id in tweets])
+        c.execute("DELETE FROM cached_tweets WHERE fetched_at < ?", (now - TWITTER_CACHE_MAX_AGE,))
+
+def pop_cached_tweet(kind):
+    """
+    Marks the newest unconsumed tweet of this kind as consumed and returns
+    its text, or None if there is none.
+    """
+    row = _fetchone("""
+    UPDATE cached_tweets SET consumed = 1
+    WHERE tweet_id = (
+        SELECT tweet_id FROM cached_tweets WHERE kind = ? AND consumed = 0 ORDER BY tweet_id DESC LIMIT 1
+    )
+    RETURNING text
+    """, (kind,))
     return row[0] if row else None
 
-def set_state(key, value):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("REPLACE INTO state (key,value) VALUES (?,?)", (key, value))
-    conn.commit()
-    conn.close()
-
-def add_recent_topic(topic, max_limit=100):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO recent_topics (topic) VALUES (?)", (topic,))
-    conn.commit()
-    c.execute("SELECT COUNT(*) FROM recent_topics")
-    count = c.fetchone()[0]
-    if count > max_limit:
+def get_cached_tweets(kind, limit=10):
+    rows = _fetchall("SELECT text FROM cached_tweets WHERE kind = ? AND consumed = 0 ORDER BY tweet_id DESC LIMIT ?",
+                     (kind, limit))
+    return [row[0] for row in rows]
+
+def cache_users(kind, users):
+    """
+    Upserts (user_id, username) tuples and prunes rows older than
+    TWITTER_CACHE_MAX_AGE.
+    """
+    now = time.time()
+    with transaction() as c:
+        c.executemany("""
+        INSERT INTO cached_users (user_id, kind, username, fetched_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET username = excluded.username, fetched_at = excluded.fetched_at
+        """, [(int(user_id), kind, username, now) for user_id, username in users])
+        c.execute("DELETE FROM cached_users WHERE fetched_at < ?", (now - TWITTER_CACHE_MAX_AGE,))
+
+def get_cached_users(kind, limit=10):
+    rows = _fetchall("SELECT username FROM cached_users WHERE kind = ? ORDER BY fetched_at DESC LIMIT ?", (kind, limit))
+    return [row[0] for row in rows]
+
+def get_http_cache_entry(cache_key):
+    row = _fetchone("""
+    SELECT status, headers, body, etag, last_modified, fetched_at, expires_at
+    FROM http_cache WHERE cache_key = ?
+    """, (cache_key,))
+    if not row:
+        return None
+    return {"status": row[0], "headers": json.loads(row[1] or "{}"), "body": row[2], "etag": row[3],
+            "last_modified": row[4], "fetched_at": row[5], "expires_at": row[6]}
+
+def put_http_cache_entry(cache_key, url, status, headers, body, etag, last_modified, expires_at, keep_stale=86400):
+    """
+    Stores a response and drops entries that have been stale for longer
+    than `keep_stale` seconds (stale entries are kept that long so they can
+    still be revalidated with ETag/Last-Modified).
+    """
+    now = time.time()
+    with transaction() as c:
         c.execute("""
-        DELETE FROM recent_topics
-        WHERE rowid IN (
-            SELECT rowid FROM recent_topics
-            ORDER BY rowid ASC
-            LIMIT ?
+        REPLACE INTO http_cache (cache_key, url, status, headers, body, etag, last_modified, fetched_at, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (cache_key, url, status, json.dumps(headers), body, etag, last_modified, now, expires_at))
+        c.execute("DELETE FROM http_cache WHERE expires_at < ?", (now - keep_stale,))
+
+def touch_http_cache_entry(cache_key, expires_at):
+    _execute("UPDATE http_cache SET fetched_at = ?, expires_at = ? WHERE cache_key = ?",
+             (time.time(), expires_at, cache_key))
+
+def get_llm_cache_entry(cache_key):
+    row = _fetchone("SELECT response FROM llm_cache WHERE cache_key = ? AND expires_at > ?", (cache_key, time.time()))
+    return row[0] if row else None
+
+def put_llm_cache_entry(cache_key, model, response, expires_at):
+    """
+    Stores a completion and drops expired ones in the same transaction.
+    """
+    now = time.time()
+    with transaction() as c:
+        c.execute("""
+        REPLACE INTO llm_cache (cache_key, model, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)
+        """, (cache_key, model, response, now, expires_at))
+        c.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+
+def add_content_drafts(drafts, ttl):
+    """
+    Stores ready-to-post drafts (dicts with kind and text, plus optional
+    image_url, image_data, topic and article_key) that expire after `ttl`
+    seconds.
+    """
+    now = time.time()
+    with transaction() as c:
+        c.executemany("""
+        INSERT INTO content_drafts (kind, text, image_url, image_data, topic, article_key, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(draft["kind"], draft["text"], draft.get("image_url"), draft.get("image_data"), draft.get("topic"),
+               draft.get("article_key"), now, now + ttl) for draft in drafts])
+
+def count_content_drafts(kind):
+    return _fetchone("SELECT COUNT(*) FROM content_drafts WHERE kind = ? AND expires_at > ?", (kind, time.time()))[0]
+
+def get_content_draft_values(kind, column):
+    if column not in ("topic", "article_key"):
+        raise ValueError(f"Unknown draft column: {column}")
+    rows = _fetchall(f"SELECT {column} FROM content_drafts WHERE kind = ? AND expires_at > ? AND {column} IS NOT NULL",
+                     (kind, time.time()))
+    return {row[0] for row in rows}
+
+def take_content_draft(kind):
+    """
+    Removes and returns the oldest unexpired draft of a kind, or None.
+    Expired drafts are deleted in the same transaction.
+    """
+    now = time.time()
+    with transaction() as c:
+        c.execute("DELETE FROM content_drafts WHERE expires_at <= ?", (now,))
+        row = c.execute("""
+        DELETE FROM content_drafts WHERE id = (
+            SELECT id FROM content_drafts WHERE kind = ? ORDER BY id ASC LIMIT 1
         )
-        """, (count - max_limit,))
-        conn.commit()
-    conn.close()
+        RETURNING text, image_url, image_data, topic, article_key
+        """, (kind,)).fetchone()
+    if row is None:
+        return None
+    return {"kind": kind, "text": row[0], "image_url": row[1], "image_data": row[2], "topic": row[3],
+            "article_key": row[4]}
 
-def get_recent_topics(limit=100):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT topic FROM recent_topics ORDER BY rowid DESC LIMIT ?", (limit,))
-    rows = c.fetchall()
-    conn.close()
-    return [row[0] for row in rows]
+def get_url_verdicts(urls):
+    """
+    Returns {url: ok} for the URLs with an unexpired verdict.
+    """
+    urls = list(urls)
+    now = time.time()
+    verdicts = {}
+    for start in range(0, len(urls), 500):
+        chunk = urls[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        verdicts.update((row[0], bool(row[1])) for row in _fetchall(
+            f"SELECT url, ok FROM url_verdicts WHERE url IN ({placeholders}) AND expires_at > ?", chunk + [now]
+        ))
+    return verdicts
+
+def put_url_verdicts(verdicts):
+    """
+    Stores (url, host, ok, status, expires_at) tuples and drops expired
+    verdicts in the same transaction.
+    """
+    now = time.time()
+    with transaction() as c:
+        c.executemany("""
+        REPLACE INTO url_verdicts (url, host, ok, status, checked_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)
+        """, [(url, host, int(ok), status, now, expires_at) for url, host, ok, status, expires_at in verdicts])
+        c.execute("DELETE FROM url_verdicts WHERE expires_at <= ?", (now,))
+
+def get_coin_prices(coin_ids):
+    """
+    Returns {coin_id: (usd, fetched_at)} for the stored ids; usd is None for
+    ids CoinGecko did not know.
+    """
+    coin_ids = list(coin_ids)
+    prices = {}
+    for start in range(0, len(coin_ids), 500):
+        chunk = coin_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        prices.update((row[0], (row[1], row[2])) for row in _fetchall(
+            f"SELECT coin_id, usd, fetched_at FROM coin_prices WHERE coin_id IN ({placeholders})", chunk
+        ))
+    return prices
+
+def put_coin_prices(prices, fetched_at):
+    with transaction() as c:
+        c.executemany("REPLACE INTO coin_prices (coin_id, usd, fetched_at) VALUES (?, ?, ?)",
+                      [(coin_id, usd, fetched_at) for coin_id, usd in prices.items()])
 
 def set_json_state(key, data):
     value = json.dumps(data)
@@ -100,78 +790,240 @@ def get_json_state(key):
         return json.loads(val)
     return None
 
-def add_pending_tweet(text, image_url=None):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO pending_tweets (text, image_url, retry_count) VALUES (?, ?, 0)", (text, image_url))
-    conn.commit()
-    conn.close()
-
-def get_pending_tweets():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, text, image_url, retry_count FROM pending_tweets ORDER BY id ASC")
-    rows = c.fetchall()
-    conn.close()
-    return [{"id": row[0], "text": row[1], "image_url": row[2], "retry_count": row[3]} for row in rows]
-
-def increment_retry_count(tweet_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE pending_tweets SET retry_count = retry_count + 1 WHERE id = ?", (tweet_id,))
-    conn.commit()
-    conn.close()
-
-def remove_pending_tweet(tweet_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM pending_tweets WHERE id=?", (tweet_id,))
-    conn.commit()
-    conn.close()
-
-def add_posted_tweet(text):
+def add_pending_tweet(text, image_url=None, priority=0, delay=0, image_data=None):
+    """
+    Queues a tweet. `image_data` keeps the image bytes for images whose URL
+    expires, such as generated ones.
+    """
+    now = time.time()
+    _execute("""
+    INSERT INTO pending_tweets (text, image_url, image_data, retry_count, priority, next_attempt_at, created_at)
+    VALUES (?, ?, ?, 0, ?, ?, ?)
+    """, (text, image_url, image_data, priority, now + delay, now))
+
+def lease_pending_tweets(limit=1, lease_seconds=PENDING_LEASE_SECONDS):
+    """
+    Claims up to `limit` ready tweets, highest priority first. Leased tweets
+    stay invisible to other workers for `lease_seconds`; if the worker never
+    completes or retries them they become ready again after that.
+    """
+    now = time.time()
+    token = uuid.uuid4().hex
+    rows = _fetchall("""
+    UPDATE pending_tweets SET next_attempt_at = ?, lease_token = ?
+    WHERE id IN (
+        SELECT id FROM pending_tweets
+        WHERE next_attempt_at <= ?
+        ORDER BY priority DESC, next_attempt_at ASC, id ASC
+        LIMIT ?
+    )
+    RETURNING id, text, image_url, retry_count, priority, image_data
+    """, (now + lease_seconds, token, now, limit))
+    rows.sort(key=lambda row: (-row[4], row[0]))
+    return [{"id": row[0], "text": row[1], "image_url": row[2], "retry_count": row[3], "priority": row[4],
+             "image_data": row[5], "lease_token": token} for row in rows]
+
+def complete_pending_tweet(tweet):
+    """
+    Removes a leased tweet from the queue. Returns False if the lease had
+    already expired and been taken by another worker.
+    """
+    cur = _execute("DELETE FROM pending_tweets WHERE id = ? AND lease_token = ?", (tweet["id"], tweet["lease_token"]))
+    return cur.rowcount == 1
+
+def release_pending_tweet(tweet):
+    """
+    Returns a leased tweet to the queue untouched, ready immediately.
+    """
+    _execute("UPDATE pending_tweets SET next_attempt_at = ?, lease_token = NULL WHERE id = ? AND lease_token = ?",
+             (time.time(), tweet["id"], tweet["lease_token"]))
+
+def pending_backoff(retry_count):
+    delay = min(PENDING_BACKOFF_MAX, PENDING_BACKOFF_BASE * (2 ** retry_count))
+    return delay * random.uniform(0.5, 1.0)
+
+def retry_pending_tweet(tweet, error=None, max_retries=PENDING_MAX_RETRIES):
+    """
+    Records a failed attempt. The tweet is rescheduled with exponential
+    backoff, or moved to dead_letter_tweets once it has used up its retries.
+    Returns True if it was dead-lettered.
+    """
+    now = time.time()
+    retry_count = tweet["retry_count"] + 1
+    with transaction() as c:
+        if retry_count >= max_retries:
+            moved = c.execute("""
+            INSERT INTO dead_letter_tweets (id, text, image_url, image_data, retry_count, last_error, created_at, failed_at)
+            SELECT id, text, image_url, image_data, ?, ?, created_at, ? FROM pending_tweets WHERE id = ? AND lease_token = ?
+            """, (retry_count, error, now, tweet["id"], tweet["lease_token"])).rowcount
+            c.execute("DELETE FROM pending_tweets WHERE id = ? AND lease_token = ?", (tweet["id"], tweet["lease_token"]))
+            return moved == 1
+        c.execute("""
+        UPDATE pending_tweets SET retry_count = ?, next_attempt_at = ?, last_error = ?, lease_token = NULL
+        WHERE id = ? AND lease_token = ?
+        """, (retry_count, now + pending_backoff(tweet["retry_count"]), error, tweet["id"], tweet["lease_token"]))
+    return False
+
+def claim_tweet(text):
+    """
+    Atomically records the tweet as posted unless it already was. Returns
+    True if this caller owns the claim and may post it.
+    """
     tweet_hash = get_tweet_hash(text)
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO posted_tweets (tweet_text, tweet_hash) VALUES (?, ?)", (text, tweet_hash))
-    conn.commit()
-    conn.close()
+    cur = _execute("INSERT OR IGNORE INTO posted_tweets (tweet_text, tweet_hash) VALUES (?, ?)", (text, tweet_hash))
+    return cur.rowcount == 1
+
+def release_tweet(text):
+    """
+    Drops a claim taken by claim_tweet when the post did not go out.
+    """
+    _execute("DELETE FROM posted_tweets WHERE tweet_hash = ?", (get_tweet_hash(text),))
 
 def is_duplicate_tweet(text):
     tweet_hash = get_tweet_hash(text)
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM posted_tweets WHERE tweet_hash = ?", (tweet_hash,))
-    result = c.fetchone()
-    conn.close()
+    result = _fetchone("SELECT 1 FROM posted_tweets WHERE tweet_hash = ?", (tweet_hash,))
     return result is not None
 
+def add_tweet_fingerprint(tweet_hash, signature, buckets, posted_at):
+    """
+    Stores a tweet's packed MinHash signature and its LSH band buckets.
+    `buckets` holds one bucket value per band, in band order.
+    """
+    with transaction() as c:
+        c.execute("REPLACE INTO tweet_fingerprints (tweet_hash, signature, posted_at) VALUES (?, ?, ?)",
+                  (tweet_hash, signature, posted_at))
+        c.executemany("INSERT OR IGNORE INTO tweet_fingerprint_bands (band, bucket, tweet_hash) VALUES (?, ?, ?)",
+                      [(band, bucket, tweet_hash) for band, bucket in enumerate(buckets)])
+
+def get_tweet_fingerprints(since):
+    return _fetchall("SELECT tweet_hash, signature, posted_at FROM tweet_fingerprints WHERE posted_at >= ?", (since,))
+
+def get_tweet_fingerprint_bands(since):
+    return _fetchall("""
+    SELECT b.band, b.bucket, b.tweet_hash
+    FROM tweet_fingerprint_bands b
+    JOIN tweet_fingerprints f ON f.tweet_hash = b.tweet_hash
+    WHERE f.posted_at >= ?
+    """, (since,))
+
+def get_unfingerprinted_tweets(since):
+    """
+    Returns (tweet_hash, tweet_text, posted_at) for posted tweets newer than
+    `since` (unix time) that have no fingerprint yet.
+    """
+    return _fetchall("""
+    SELECT p.tweet_hash, p.tweet_text, CAST(strftime('%s', p.posted_at) AS REAL)
+    FROM posted_tweets p
+    LEFT JOIN tweet_fingerprints f ON f.tweet_hash = p.tweet_hash
+    WHERE p.posted_at >= datetime(?, 'unixepoch') AND f.tweet_hash IS NULL AND p.tweet_hash IS NOT NULL
+    """, (since,))
+
+def prune_tweet_fingerprints(before):
+    with transaction() as c:
+        c.execute("""
+        DELETE FROM tweet_fingerprint_bands WHERE tweet_hash IN (
+            SELECT tweet_hash FROM tweet_fingerprints WHERE posted_at < ?
+        )
+        """, (before,))
+        c.execute("DELETE FROM tweet_fingerprints WHERE posted_at < ?", (before,))
+
+def add_news_articles(articles, query=None):
+    """
+    Stores parsed articles keyed by their canonical URL ("url_key") and
+    returns the ones that were not stored before, in input order. Existing
+    keys are looked up in chunks and the new rows go in with one
+    executemany, all inside a single transaction.
+    """
+    now = time.time()
+    with transaction() as c:
+        keys = [article["url_key"] for article in articles]
+        seen = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            seen.update(row[0] for row in c.execute(
+                f"SELECT url_key FROM news_articles WHERE url_key IN ({placeholders})", chunk
+            ))
+        new_articles = []
+        for article in articles:
+            if article["url_key"] not in seen:
+                seen.add(article["url_key"])
+                new_articles.append(article)
+        c.executemany("""
+        INSERT INTO news_articles (url_key, url, title, description, source, published_at, query, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(article["url_key"], article.get("url"), article["title"], article.get("description"),
+               article.get("source"), article.get("published_at"), query, now) for article in new_articles])
+    return new_articles
+
+def get_recent_news_articles(query=None, limit=10, untweeted=False):
+    rows = _fetchall(f"""
+    SELECT title, description, url, source, published_at, url_key FROM news_articles
+    WHERE query IS ? {"AND tweeted_at IS NULL" if untweeted else ""}
+    ORDER BY published_at DESC
+    LIMIT ?
+    """, (query, limit))
+    return [{"title": row[0], "description": row[1], "url": row[2], "source": row[3], "published_at": row[4],
+             "url_key": row[5]} for row in rows]
+
+def mark_news_article_tweeted(url_key):
+    _execute("UPDATE news_articles SET tweeted_at = ? WHERE url_key = ?", (time.time(), url_key))
+
 def get_recent_posted_tweets(limit=100):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT tweet_text FROM posted_tweets ORDER BY posted_at DESC LIMIT ?", (limit,))
-    rows = c.fetchall()
-    conn.close()
+    rows = _fetchall("SELECT tweet_text FROM posted_tweets ORDER BY posted_at DESC LIMIT ?", (limit,))
     return [row[0] for row in rows]
 
+def _trim_prompt_examples(c, style, keep=None):
+    # Keeps only the newest `keep` examples of a style; walks the
+    # (style, id) index so the cost depends on `keep`, not the table size.
+    keep = PROMPT_EXAMPLES_PER_STYLE if keep is None else keep
+    c.execute("""
+    DELETE FROM prompt_examples WHERE style = ? AND id < (
+        SELECT id FROM prompt_examples WHERE style = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+    )
+    """, (style, style, keep - 1))
+
 def add_prompt_example(role, content, style="tweet"):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO prompt_examples (role, content, style) VALUES (?, ?, ?)", (role, content, style))
-    conn.commit()
-    conn.close()
+    return add_prompt_examples([(role, content, style)])[0]
+
+def add_prompt_examples(examples):
+    """
+    Inserts (role, content, style) tuples with one executemany in a single
+    transaction and returns their ids in input order. Each style is trimmed
+    to PROMPT_EXAMPLES_PER_STYLE once at the end, so ids beyond the cap may
+    already be gone when a batch is larger than the cap.
+    """
+    examples = list(examples)
+    if not examples:
+        return []
+    with transaction() as c:
+        c.executemany("INSERT INTO prompt_examples (role, content, style) VALUES (?, ?, ?)", examples)
+        # The write lock is held, so AUTOINCREMENT ids of the batch are consecutive.
+        last_id = c.execute("SELECT last_insert_rowid()").fetchone()[0]
+        for style in {example[2] for example in examples}:
+            _trim_prompt_examples(c, style)
+    return list(range(last_id - len(examples) + 1, last_id + 1))
 
 def get_prompt_examples(style="tweet", limit=5):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT role, content FROM prompt_examples WHERE style=? ORDER BY RANDOM() LIMIT ?", (style, limit))
-    rows = c.fetchall()
-    conn.close()
-    return [{"role": row[0], "content": row[1]} for row in rows]
-
-def delete_prompt_examples(style="tweet", limit=5):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM prompt_examples WHERE style=? ORDER BY rowid DESC LIMIT ?", (style, limit))
-    conn.commit()
-    conn.close()
+    """
+    Returns up to `limit` random examples of a style without scanning the
+    table: each pick seeks the (style, id) index at a random id between the
+    style's lowest and highest id.
+    """
+    low, high = _fetchone("""
+    SELECT (SELECT id FROM prompt_examples WHERE style = ? ORDER BY id ASC LIMIT 1),
+           (SELECT id FROM prompt_examples WHERE style = ? ORDER BY id DESC LIMIT 1)
+    """, (style, style))
+    if low is None:
+        return []
+    picked = {}
+    for _ in range(limit * 3):
+        if len(picked) >= limit:
+            break
+        row = _fetchone(
+            "SELECT id, role, content FROM prompt_examples WHERE style = ? AND id >= ? ORDER BY id ASC LIMIT 1",
+            (style, random.randint(low, high))
+        )
+        if row:
+            picked[row[0]] = {"role": row[1], "content": row[2]}
+    return list(picked.values())
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import requests
+import http_client
+from urllib.parse import urlencode
+from database import get_http_cache_entry, put_http_cache_entry, touch_http_cache_entry
+from rate_limiter import RateLimited, try_acquire, wait_time, block, update_from_headers
+
+HTTP_CACHE_DEFAULT_TTL = float(os.getenv("HTTP_CACHE_DEFAULT_TTL", "300"))
+
+# Freshness lifetimes by URL prefix, used when the server sends no max-age.
+# The longest matching prefix wins.
+ENDPOINT_TTLS = {
+    "https://newsapi.org/v2/": 3600,
+    "https://api.coingecko.com/api/v3/search/trending": 600,
+    "https://api.coingecko.com/api/v3/": 300,
+}
+
+# Only these response headers are stored with a cached body.
+STORED_HEADERS = ("content-type", "etag", "last-modified", "cache-control", "date")
+
+_max_age_re = re.compile(r"max-age=(\d+)")
+
+_stats = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0}
+_stats_lock = threading.Lock()
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+def get_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+class CachedResponse:
+    """
+    Minimal stand-in for requests.Response built from a cache entry.
+    """
+
+    from_cache = True
+
+    def __init__(self, url, entry):
+        self.url = url
+        self.status_code = entry["status"]
+        self.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        self.content = entry["body"] or b""
+        self.fetched_at = entry["fetched_at"]
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+def _cache_key(url, params):
+    # Keys are hashed so query secrets such as apiKey are never stored.
+    full = f"{url}?{urlencode(sorted((params or {}).items()))}"
+    return hashlib.sha256(full.encode("utf-8")).hexdigest()
+
+def endpoint_ttl(url):
+    matches = [prefix for prefix in ENDPOINT_TTLS if url.startswith(prefix)]
+    if not matches:
+        return HTTP_CACHE_DEFAULT_TTL
+    return ENDPOINT_TTLS[max(matches, key=len)]
+
+def _freshness(headers, url, ttl):
+    """
+    Returns how long a response may be served from cache, or None if the
+    server forbids storing it.
+    """
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return None
+    if ttl is not None:
+        return ttl
+    if "no-cache" in cache_control:
+        return 0
+    match = _max_age_re.search(cache_control)
+    if match:
+        return int(match.group(1))
+    return endpoint_ttl(url)
+
+def cached_get(url, params=None, headers=None, timeout=10, ttl=None, bucket=None):
+    """
+    GETs a URL through the persistent cache. Fresh entries are served from
+    SQLite without a request; stale ones are revalidated with
+    If-None-Match / If-Modified-Since. `ttl` overrides the server's max-age
+    and the per-endpoint default. Non-200 responses are returned, not cached.
+
+    With `bucket`, a network request first takes a token from that rate
+    limit bucket and feeds the response's rate-limit headers back into it.
+    If the bucket is empty a stale entry is served when there is one;
+    otherwise RateLimited is raised.
+    """
+    key = _cache_key(url, params)
+    entry = get_http_cache_entry(key)
+    now = time.time()
+    if entry and entry["expires_at"] > now:
+        _count("hits")
+        return CachedResponse(url, entry)
+
+    if bucket and not try_acquire(bucket):
+        if entry:
+            _count("hits")
+            logging.debug(f"Rate limit bucket '{bucket}' empty, serving stale cache for {url}.")
+            return CachedResponse(url, entry)
+        raise RateLimited(bucket, wait_time(bucket))
+
+    request_headers = dict(headers or {})
+    if entry:
+        if entry["etag"]:
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = http_client.get(url, params=params, headers=request_headers, timeout=timeout)
+    if bucket:
+        update_from_headers(bucket, response.headers)
+        if response.status_code == 429 and "Retry-After" not in response.headers:
+            block(bucket, 60)
+
+    if response.status_code == 304 and entry:
+        _count("revalidated")
+        lifetime = _freshness(response.headers, url, ttl) or 0
+        touch_http_cache_entry(key, time.time() + lifetime)
+        return CachedResponse(url, dict(entry, fetched_at=time.time()))
+
+    _count("misses")
+    if response.status_code == 200:
+        lifetime = _freshness(response.headers, url, ttl)
+        if lifetime is not None:
+            stored = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+            put_http_cache_entry(
+                key, url, response.status_code, stored, response.content,
+                response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                time.time() + lifetime
+            )
+            _count("stored")
+    logging.debug(f"HTTP cache miss for {url}: status {response.status_code}")
+    return response
+
+def cached_get_checked(url, **kwargs):
+    """
+    cached_get that raises requests.HTTPError for 5xx responses, for use
+    inside resilience.call so server errors are retried and count against
+    the dependency's circuit. Other statuses are returned as they are.
+    """
+    response = cached_get(url, **kwargs)
+    if response.status_code >= 500:
+        response.raise_for_status()
+    return response
@@ -0,0 +1,96 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+# Number of hosts whose pools are kept, and keep-alive connections per host.
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "32"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8"))
+
+# Upper bounds (seconds) of the per-host latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+_latency = {}
+_latency_lock = threading.Lock()
+_hooks = []
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "x-ai-bot"})
+    return session
+
+_session = _build_session()
+
+def add_hook(hook):
+    """
+    Registers hook(method, host, status, elapsed) to be called after every
+    request; status is None when the request raised.
+    """
+    _hooks.append(hook)
+
+def _record(method, host, status, elapsed):
+    with _latency_lock:
+        stats = _latency.setdefault(host, {"count": 0, "errors": 0, "total": 0.0, "buckets": [0] * len(LATENCY_BUCKETS)})
+        stats["count"] += 1
+        stats["total"] += elapsed
+        stats["buckets"][bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        if status is None or status >= 500:
+            stats["errors"] += 1
+    for hook in _hooks:
+        try:
+            hook(method, host, status, elapsed)
+        except Exception as e:
+            logging.error(f"HTTP client hook failed: {e}")
+
+def get_latency_stats():
+    """
+    Returns {host: {"count", "errors", "mean", "buckets"}} where buckets
+    maps each LATENCY_BUCKETS bound to the number of requests up to it.
+    """
+    with _latency_lock:
+        return {
+            host: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "mean": stats["total"] / stats["count"],
+                "buckets": dict(zip(LATENCY_BUCKETS, stats["buckets"])),
+            }
+            for host, stats in _latency.items()
+        }
+
+def _timeout(timeout):
+    if timeout is None:
+        return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    if isinstance(timeout, tuple):
+        return timeout
+    return (min(HTTP_CONNECT_TIMEOUT, timeout), timeout)
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Sends a request through the shared keep-alive session. A numeric
+    `timeout` bounds the read and caps the connect timeout.
+    """
+    host = urlsplit(url).netloc.lower()
+    start = time.monotonic()
+    status = None
+    try:
+        response = _session.request(method, url, timeout=_timeout(timeout), **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        _record(method, host, status, time.monotonic() - start)
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def head(url, **kwargs):
+    return request("HEAD", url, **kwargs)
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from database import get_llm_cache_entry, put_llm_cache_entry
+
+# Seconds a completion is reused, by call site. Override one with
+# LLM_CACHE_TTL_<SITE>. Call sites not listed here are not cached.
+LLM_CACHE_TTLS = {
+    "trends": 6 * 60 * 60,
+    "viral_coins": 6 * 60 * 60,
+}
+
+_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+_stats_lock = threading.Lock()
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+def get_llm_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+def cache_ttl(site):
+    override = os.getenv(f"LLM_CACHE_TTL_{site.upper()}")
+    if override:
+        return float(override)
+    return LLM_CACHE_TTLS.get(site)
+
+def cache_key(model, messages, params):
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = ""
+
+def cached_completion(site, model, messages, params, call):
+    """
+    Returns call() for a chat completion, reusing a stored response for the
+    same (model, messages, params) while the call site's TTL lasts.
+    Concurrent identical requests wait for the one already in flight
+    instead of calling the API again. With no TTL for `site` (or site None)
+    the call goes straight through, for prompts that want fresh samples.
+    Empty responses are never stored.
+    """
+    ttl = cache_ttl(site) if site else None
+    if not ttl:
+        return call()
+
+    key = cache_key(model, messages, params)
+    cached = get_llm_cache_entry(key)
+    if cached is not None:
+        _count("hits")
+        logging.debug(f"LLM cache hit for '{site}'.")
+        return cached
+
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    if not leader:
+        _count("coalesced")
+        flight.done.wait()
+        return flight.result
+
+    _count("misses")
+    try:
+        flight.result = call()
+        if flight.result:
+            put_llm_cache_entry(key, model, flight.result, time.time() + ttl)
+        return flight.result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        flight.done.set()
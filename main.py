@@ -1,6 +1,6 @@
 import time
 import logging
-from database import init_db, get_state, set_state
+from database import init_db, get_state, set_state, flush_state, state_store
 from bot import (
     perform_single_request,
     reply_to_cached_mentions,
@@ -10,9 +10,21 @@ from bot import (
     proactive_engagement_if_no_mentions,
     get_my_user_id,
     tweet_latest_crypto_news,
-    process_pending_tweets
+    process_pending_tweets,
+    price_watchlist,
+    CONTENT_COMPOSERS
 )
 from news import refresh_prompt_examples
+from http_cache import get_cache_stats
+from http_client import get_latency_stats
+from prompt_budget import get_prompt_stats
+from prompt_packs import reload_prompt_packs
+from llm_cache import get_llm_cache_stats
+from content_inventory import ContentProducer
+from price_service import PriceRefresher
+from resilience import get_circuit_states, available as dependency_available
+from post_budget import can_post, maybe_reset_daily_limit
+from rate_limiter import available, wait_time
 import os
 from dotenv import load_dotenv
 import signal
@@ -32,65 +44,19 @@ logging.basicConfig(
 
 REQUEST_INTERVAL = int(os.getenv("REQUEST_INTERVAL", "1200"))         # 20 minutes
 POST_INTERVAL = int(os.getenv("POST_INTERVAL", "3600"))               # 1 hour
-MAX_POSTS_PER_DAY = int(os.getenv("MAX_POSTS_PER_DAY", "12"))         # Default 12 if not set
 
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 USER_HANDLE = os.getenv("USER_HANDLE")
 
 def signal_handler(sig, frame):
     logging.info("Shutdown signal received. Exiting gracefully...")
+    flush_state()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
-
-def get_daily_post_count():
-    val = get_state("daily_post_count")
-    return int(val) if val else 0
-
-def set_daily_post_count(count):
-    set_state("daily_post_count", str(count))
-
-def reset_daily_post_count():
-    set_daily_post_count(0)
-
-def get_daily_reset_time():
-    val = get_state("daily_reset_time")
-    if val:
-        return float(val)
-    else:
-        # Set reset time to next midnight UTC
-        now = datetime.datetime.now(datetime.UTC)
-        tomorrow = now + datetime.timedelta(days=1)
-        midnight = datetime.datetime(tomorrow.year, tomorrow.month, tomorrow.day, 0, 0, 0)
-        reset_ts = midnight.timestamp()
-        set_state("daily_reset_time", str(reset_ts))
-        return reset_ts
-
-def maybe_reset_daily_limit():
-    # Check if current time > daily_reset_time, if so reset
-    now = time.time()
-    reset_ts = get_daily_reset_time()
-    if now > reset_ts:
-        logging.info("Daily post count limit resetting.")
-        reset_daily_post_count()
-        # Set next reset time
-        now_dt = datetime.datetime.now(datetime.UTC)
-        tomorrow = now_dt + datetime.timedelta(days=1)
-        midnight = datetime.datetime(tomorrow.year, tomorrow.month, tomorrow.day, 0, 0, 0)
-        next_reset_ts = midnight.timestamp()
-        set_state("daily_reset_time", str(next_reset_ts))
-
-def increment_post_count():
-    count = get_daily_post_count()
-    count += 1
-    set_daily_post_count(count)
-    return count
-
-def can_post():
-    # Check daily limit
-    count = get_daily_post_count()
-    return count < MAX_POSTS_PER_DAY
+if hasattr(signal, "SIGHUP"):
+    signal.signal(signal.SIGHUP, lambda sig, frame: reload_prompt_packs())
 
 # Define the tasks we want to rotate through
 TASKS = [
@@ -103,6 +69,23 @@ TASKS = [
     process_pending_tweets
 ]
 
+# Dependencies each task cannot work without. While one of them has an open
+# circuit the task is skipped in favour of the next runnable one.
+TASK_DEPENDENCIES = {
+    tweet_latest_crypto_news: ("twitter", "openai"),
+    tweet_about_crypto_trend: ("twitter", "openai"),
+    promote_account: ("twitter", "openai"),
+    reply_to_cached_mentions: ("twitter", "openai"),
+    proactive_engagement_if_no_mentions: ("twitter", "openai"),
+    process_pending_tweets: ("twitter",),
+}
+
+def task_runnable(task):
+    down = [name for name in TASK_DEPENDENCIES.get(task, ()) if not dependency_available(name)]
+    if down:
+        logging.info(f"Skipping {task.__name__}: {', '.join(down)} unavailable.")
+    return not down
+
 def get_next_task_index():
     val = get_state("task_index")
     if val is None:
@@ -116,16 +99,25 @@ def set_next_task_index(idx):
 def perform_post_task():
     posted = False
     idx = get_next_task_index()
+    for offset in range(len(TASKS)):
+        if task_runnable(TASKS[(idx + offset) % len(TASKS)]):
+            idx = (idx + offset) % len(TASKS)
+            break
+    else:
+        logging.warning("No task can run while its dependencies are down.")
+        return posted
     task = TASKS[idx]
     logging.info(f"Rotating tasks. Current task: {task.__name__}")
     
-    if can_post():
-        before_count = get_daily_post_count()
-        task()
-        after_count = get_daily_post_count()
+    if not available("twitter_post"):
+        logging.info(f"Tweet rate limit bucket is empty for another {wait_time('twitter_post'):.0f}s. Skipping posting tasks.")
+    elif can_post():
+        try:
+            posted = bool(task())
+        except Exception as e:
+            # One failing task must not stop the main loop.
+            logging.error(f"Task {task.__name__} failed: {e}")
 
-        posted = after_count > before_count
-        
         if posted:
             logging.info("A new tweet was posted by the task.")
         else:
@@ -145,7 +137,7 @@ def perform_daily_prompt_refresh():
     
     if last_refresh_date != today_date_str:
         logging.info("Refreshing prompt examples for the day...")
-        refresh_prompt_examples(api_key=NEWS_API_KEY, user_handle=USER_HANDLE, limit=5, page_size=5)
+        refresh_prompt_examples(api_key=NEWS_API_KEY, user_handle=USER_HANDLE, page_size=5)
         set_state("last_prompt_refresh_date", today_date_str)
     else:
         logging.debug("Prompt examples already refreshed today.")
@@ -153,6 +145,12 @@ def perform_daily_prompt_refresh():
 if __name__ == "__main__":
     logging.info("Initializing database...")
     init_db()
+    state_store.start_flusher()
+    # Fills the draft inventory in the background while the loop sleeps.
+    content_producer = ContentProducer(CONTENT_COMPOSERS, active=can_post)
+    content_producer.start()
+    # Keeps coin prices for the cached trends warm for the trend tweets.
+    PriceRefresher(price_watchlist).start()
 
     # On startup, maybe reset daily limit if needed
     maybe_reset_daily_limit()
@@ -195,7 +193,9 @@ if __name__ == "__main__":
 
         # Perform a single request cycle if needed
         if user_id:
-            if (now - last_request) > REQUEST_INTERVAL:
+            if not dependency_available("twitter"):
+                logging.info("Twitter circuit is open, skipping this Twitter request cycle.")
+            elif (now - last_request) > REQUEST_INTERVAL:
                 logging.debug("Time to perform a single Twitter API request...")
                 perform_single_request(user_id)
                 last_request = now
@@ -208,9 +208,15 @@ if __name__ == "__main__":
                 posted = perform_post_task()
                 if posted:
                   last_post = now
-                  set_state("last_post_time", str(now))
+                  set_state("last_post_time", str(now), durable=True)
             else:
                 logging.debug("Not time for a new Twitter post yet...")
 
+        flush_state()
+        logging.debug(f"HTTP cache stats: {get_cache_stats()}")
+        logging.debug(f"HTTP latency by host: {get_latency_stats()}")
+        logging.debug(f"Prompt token stats: {get_prompt_stats()}")
+        logging.debug(f"LLM cache stats: {get_llm_cache_stats()}")
+        logging.debug(f"Circuit states: {get_circuit_states()}")
         logging.debug("Sleeping until next iteration...")
         time.sleep(min(REQUEST_INTERVAL, POST_INTERVAL))
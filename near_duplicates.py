@@ -0,0 +1,167 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from database import (
+    get_tweet_hash,
+    add_tweet_fingerprint,
+    get_tweet_fingerprints,
+    get_tweet_fingerprint_bands,
+    get_unfingerprinted_tweets,
+    prune_tweet_fingerprints
+)
+
+NEAR_DUP_MIN_SIMILARITY = float(os.getenv("NEAR_DUP_MIN_SIMILARITY", "0.6"))
+NEAR_DUP_WINDOW_DAYS = float(os.getenv("NEAR_DUP_WINDOW_DAYS", "30"))
+
+# 64 MinHash values split into 16 bands of 4: a pair with Jaccard
+# similarity 0.6 shares a band with probability 0.9, one at 0.3 with 0.12.
+MINHASH_PERMUTATIONS = 64
+MINHASH_BAND_ROWS = 4
+_PRIME = (1 << 61) - 1
+_HASH_MASK = (1 << 32) - 1
+
+_url_re = re.compile(r"https?://\S+")
+_token_re = re.compile(r"[a-z0-9$]+")
+
+def _tokens(text):
+    # URLs, emoji, punctuation and the #/@ prefixes carry no meaning for
+    # near-duplicate checks, so only lowercase word tokens are kept.
+    text = _url_re.sub(" ", text.lower())
+    return _token_re.findall(text)
+
+def _features(text):
+    tokens = _tokens(text)
+    return frozenset(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+
+def _permutation(index):
+    seed = hashlib.blake2b(f"minhash:{index}".encode("ascii"), digest_size=16).digest()
+    return int.from_bytes(seed[:8], "big") % (_PRIME - 1) + 1, int.from_bytes(seed[8:], "big") % _PRIME
+
+_PERMUTATIONS = [_permutation(index) for index in range(MINHASH_PERMUTATIONS)]
+
+@lru_cache(maxsize=65536)
+def _feature_hashes(feature):
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+    return tuple(((a * h + b) % _PRIME) & _HASH_MASK for a, b in _PERMUTATIONS)
+
+def minhash(text):
+    """
+    Returns the MinHash signature of the text's word unigrams and bigrams:
+    one minimum per permutation, so the share of equal positions between
+    two signatures estimates the Jaccard similarity of their feature sets.
+    Returns None for a text without word tokens (e.g. only URLs or emoji),
+    which is neither indexed nor matched.
+    """
+    features = _features(text)
+    if not features:
+        return None
+    return tuple(min(column) for column in zip(*(_feature_hashes(feature) for feature in features)))
+
+def similarity(a, b):
+    """
+    Estimated Jaccard similarity of two MinHash signatures.
+    """
+    return sum(x == y for x, y in zip(a, b)) / MINHASH_PERMUTATIONS
+
+def _pack(signature):
+    return b"".join(value.to_bytes(4, "big") for value in signature)
+
+def _unpack(blob):
+    return tuple(int.from_bytes(blob[i:i + 4], "big") for i in range(0, len(blob), 4))
+
+class NearDuplicateIndex:
+    """
+    Banded LSH index over MinHash signatures of posted tweets. Each band of
+    MINHASH_BAND_ROWS values is hashed to a bucket; tweets sharing a bucket
+    are candidates, confirmed by their estimated similarity. Buckets are
+    persisted in SQLite and mirrored in memory for lookups.
+    """
+
+    def __init__(self, min_similarity=NEAR_DUP_MIN_SIMILARITY, window_days=NEAR_DUP_WINDOW_DAYS):
+        self.min_similarity = min_similarity
+        self.window = window_days * 24 * 60 * 60
+        self.bands = MINHASH_PERMUTATIONS // MINHASH_BAND_ROWS
+        self._fingerprints = None
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _band_buckets(self, signature):
+        return [
+            int.from_bytes(hashlib.blake2b(_pack(signature[start:start + MINHASH_BAND_ROWS]), digest_size=7).digest(), "big")
+            for start in range(0, MINHASH_PERMUTATIONS, MINHASH_BAND_ROWS)
+        ]
+
+    def _remember(self, tweet_hash, signature, posted_at):
+        self._fingerprints[tweet_hash] = (signature, posted_at)
+        for band, bucket in enumerate(self._band_buckets(signature)):
+            self._buckets.setdefault((band, bucket), set()).add(tweet_hash)
+
+    def load(self):
+        """
+        Loads fingerprints inside the window into memory, fingerprinting any
+        posted tweets that do not have one yet and pruning expired rows.
+        """
+        with self._lock:
+            since = time.time() - self.window
+            prune_tweet_fingerprints(since)
+            for tweet_hash, text, posted_at in get_unfingerprinted_tweets(since):
+                signature = minhash(text)
+                if signature is None:
+                    continue
+                add_tweet_fingerprint(tweet_hash, _pack(signature), self._band_buckets(signature), posted_at)
+            self._fingerprints = {}
+            self._buckets = {}
+            for tweet_hash, signature, posted_at in get_tweet_fingerprints(since):
+                self._fingerprints[tweet_hash] = (_unpack(signature), posted_at)
+            for band, bucket, tweet_hash in get_tweet_fingerprint_bands(since):
+                self._buckets.setdefault((band, bucket), set()).add(tweet_hash)
+            logging.debug(f"Loaded {len(self._fingerprints)} tweet fingerprints.")
+
+    def find(self, text):
+        """
+        Returns the hash of a tweet posted inside the window whose estimated
+        similarity to the text is at least min_similarity, or None.
+        """
+        if self._fingerprints is None:
+            self.load()
+        signature = minhash(text)
+        if signature is None:
+            return None
+        since = time.time() - self.window
+        with self._lock:
+            seen = set()
+            for band, bucket in enumerate(self._band_buckets(signature)):
+                for tweet_hash in self._buckets.get((band, bucket), ()):
+                    if tweet_hash in seen:
+                        continue
+                    seen.add(tweet_hash)
+                    other, posted_at = self._fingerprints.get(tweet_hash, (None, 0))
+                    if other is None or posted_at < since:
+                        continue
+                    if similarity(signature, other) >= self.min_similarity:
+                        return tweet_hash
+        return None
+
+    def add(self, text, posted_at=None):
+        if self._fingerprints is None:
+            self.load()
+        posted_at = posted_at or time.time()
+        tweet_hash = get_tweet_hash(text)
+        signature = minhash(text)
+        if signature is None:
+            return
+        add_tweet_fingerprint(tweet_hash, _pack(signature), self._band_buckets(signature), posted_at)
+        with self._lock:
+            self._remember(tweet_hash, signature, posted_at)
+
+near_duplicate_index = NearDuplicateIndex()
+
+def is_near_duplicate_tweet(text):
+    return near_duplicate_index.find(text) is not None
+
+def remember_posted_tweet(text):
+    near_duplicate_index.add(text)
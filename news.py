@@ -1,91 +1,61 @@
-import requests
 import logging
-import time
-from cachetools import TTLCache, cached
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
-from database import add_prompt_example, delete_prompt_examples
-
-news_cache = TTLCache(maxsize=100, ttl=3600)
-
-@cached(cache=news_cache)
-def fetch_latest_crypto_news_cached(api_key, user_handle, query="cryptocurrency", language="en", page_size=10):
-    return fetch_and_process_crypto_news(api_key, user_handle, query, language, page_size)
-
-@retry(
-    retry=retry_if_exception_type(requests.exceptions.RequestException),
-    wait=wait_exponential(multiplier=1, min=4, max=10),
-    stop=stop_after_attempt(5)
+from news_sources import configured_sources, fetch_all
+from news_ranking import rank_articles
+from database import (
+    transaction, add_prompt_examples, add_news_articles, get_recent_news_articles, get_recent_posted_tweets
 )
-def fetch_and_process_crypto_news(api_key, user_handle, query="cryptocurrency", language="en", page_size=10):
+
+def best_crypto_news_articles(api_key, user_handle, query="cryptocurrency", language="en", page_size=10,
+                              count=1, exclude=(), candidates=30):
     """
-    Fetches and processes the latest crypto news articles from NewsAPI.
+    Ingests new articles, then ranks the newest stored articles that have
+    not been tweeted yet and returns the best `count`, skipping url_keys in
+    `exclude`.
     """
-    url = "https://newsapi.org/v2/everything"
-    params = {
-        "q": query,
-        "language": language,
-        "sortBy": "publishedAt",
-        "pageSize": page_size,
-        "apiKey": api_key
-    }
-
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        if response.status_code == 429:
-            retry_after = int(response.headers.get("Retry-After", 60))
-            logging.warning(f"Rate limit exceeded. Retrying after {retry_after} seconds.")
-            time.sleep(retry_after)
-            return fetch_and_process_crypto_news(api_key, user_handle, query, language, page_size)
-        response.raise_for_status()
-        data = response.json()
-
-        if data.get("status") != "ok":
-            logging.error(f"Error fetching news: {data.get('message')}")
-            return []
-
-        articles = data.get("articles", [])
-        logging.debug(f"Fetched {len(parsed_articles)} news articles: {articles}.");
-        parsed_articles = process_articles(articles, user_handle)
-        return parsed_articles
-
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Request exception while fetching news: {e}")
-        return []
-    except ValueError as ve:
-        logging.error(f"JSON decoding failed: {ve}")
-        return []
+    aggregate_crypto_news(api_key, user_handle, query, language, page_size)
+    articles = [a for a in get_recent_news_articles(query=query, limit=candidates, untweeted=True)
+                if a["url_key"] not in exclude]
+    ranked = rank_articles(articles, query=query, recent_tweets=get_recent_posted_tweets(limit=50))
+    for score, article in ranked[:count]:
+        logging.info(f"Ranked article (score {score:.2f}) of {len(articles)} candidates: {article['title']}")
+    return [article for _, article in ranked[:count]]
+
+def best_crypto_news_article(api_key, user_handle, query="cryptocurrency", language="en", page_size=10, candidates=30):
+    """
+    Returns the best untweeted article (see best_crypto_news_articles), or None.
+    """
+    articles = best_crypto_news_articles(api_key, user_handle, query, language, page_size, candidates=candidates)
+    return articles[0] if articles else None
 
-def process_articles(articles, user_handle):
+def aggregate_crypto_news(api_key, user_handle, query="cryptocurrency", language="en", page_size=10):
     """
-    Processes articles and adds them as prompt examples in the database.
+    Fetches NewsAPI and any configured RSS/JSON feeds concurrently and
+    processes the merged articles that have not been seen before.
     """
-    parsed_articles = []
-    for article in articles:
-        if not article.get("title") or not article.get("description"):
-            continue
+    articles = fetch_all(configured_sources(api_key, query, language, page_size))
+    return store_articles(articles, user_handle, query=query)
 
-        title = article["title"]
-        description = article["description"]
-        
-        example_tweet = f"\ud83d\uddde {title}\n{description}\n{user_handle}"
-        example_tweet = example_tweet.encode("utf-16", "surrogatepass").decode("utf-16")
+def article_prompt_example(article, user_handle):
+    example_tweet = f"\ud83d\uddde {article['title']}\n{article['description']}\n{user_handle}"
+    return example_tweet.encode("utf-16", "surrogatepass").decode("utf-16")
 
-        add_prompt_example("assistant", example_tweet, style="tweet")
-        parsed_articles.append({
-            "title": title,
-            "description": description,
-            "url": article.get("url"),
-            "source": article.get("source", {}).get("name"),
-            "published_at": article.get("publishedAt")
-        })
+def store_articles(articles, user_handle, query=None):
+    """
+    Stores articles, deduplicated by canonical URL, and adds only the new
+    ones as prompt examples, all in one database transaction.
+    """
+    with transaction():
+        new_articles = add_news_articles(articles, query=query)
+        add_prompt_examples(
+            ("assistant", article_prompt_example(article, user_handle), "tweet") for article in new_articles
+        )
 
-    logging.info(f"Processed {len(parsed_articles)} crypto news articles.")
-    return parsed_articles
+    logging.info(f"Processed {len(new_articles)} new of {len(articles)} crypto news articles.")
+    return new_articles
 
-def refresh_prompt_examples(api_key, user_handle, query="cryptocurrency", language="en", limit=10, page_size=5):
+def refresh_prompt_examples(api_key, user_handle, query="cryptocurrency", language="en", page_size=5):
     """
-    Deletes the older prompt examples and refreshes with the latest crypto news articles.
+    Adds prompt examples for crypto news published since the last refresh.
+    Old examples are trimmed by the per-style retention cap in the database.
     """
-    delete_prompt_examples(style="tweet", limit=limit)
-    fetch_and_process_crypto_news(api_key, user_handle, query, language, page_size)
-    
\ No newline at end of file
+    return aggregate_crypto_news(api_key, user_handle, query, language, page_size)
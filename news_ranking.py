@@ -0,0 +1,113 @@
+import os
+import re
+import math
+import time
+import logging
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from datetime import datetime
+
+# Weighted sum of the per-article signals, each scaled to 0..1.
+RANK_WEIGHTS = {"recency": 0.3, "source": 0.15, "relevance": 0.3, "novelty": 0.25}
+
+NEWS_RANK_HALF_LIFE_HOURS = float(os.getenv("NEWS_RANK_HALF_LIFE_HOURS", "6"))
+NEWS_MIN_NOVELTY = float(os.getenv("NEWS_MIN_NOVELTY", "0.3"))
+NEWS_MIN_RELEVANCE = float(os.getenv("NEWS_MIN_RELEVANCE", "0.05"))
+
+# NEWS_SOURCE_WEIGHTS=coindesk=1.0,cointelegraph=0.8 ; unlisted sources get
+# NEWS_DEFAULT_SOURCE_WEIGHT. Names are matched case-insensitively as a
+# substring of the article's source.
+NEWS_SOURCE_WEIGHTS = {
+    name.strip().lower(): float(weight)
+    for name, _, weight in (
+        item.partition("=") for item in os.getenv("NEWS_SOURCE_WEIGHTS", "").split(",") if "=" in item
+    )
+}
+NEWS_DEFAULT_SOURCE_WEIGHT = float(os.getenv("NEWS_DEFAULT_SOURCE_WEIGHT", "0.5"))
+
+# Terms that count towards relevance in addition to the query itself.
+CRYPTO_TERMS = (
+    "crypto", "cryptocurrency", "bitcoin", "btc", "ethereum", "eth", "blockchain", "defi",
+    "token", "stablecoin", "altcoin", "solana", "nft", "web3", "exchange", "etf", "wallet", "mining"
+)
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "will with after over into new says about more than their they but not".split()
+)
+
+_word_re = re.compile(r"[a-z0-9$]+")
+
+def tokenize(text):
+    return [word for word in _word_re.findall((text or "").lower()) if word not in STOPWORDS and len(word) > 1]
+
+def _published_ts(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def source_weight(source):
+    source = (source or "").lower()
+    matches = [weight for name, weight in NEWS_SOURCE_WEIGHTS.items() if name in source]
+    return max(matches) if matches else NEWS_DEFAULT_SOURCE_WEIGHT
+
+def _tfidf(counts, idf):
+    vector = {term: (1 + math.log(count)) * idf.get(term, 0.0) for term, count in counts.items()}
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    return {term: value / norm for term, value in vector.items()} if norm else {}
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(term, 0.0) for term, value in a.items())
+
+def rank_articles(articles, query="cryptocurrency", recent_tweets=(), now=None):
+    """
+    Scores a batch of articles and returns (score, article) pairs, best
+    first. Every article is tokenized once; relevance is the TF-IDF cosine
+    against the query plus CRYPTO_TERMS, and novelty is one minus the best
+    cosine against recently posted tweets, with IDF taken over the batch and
+    the tweets together. Articles below NEWS_MIN_NOVELTY or
+    NEWS_MIN_RELEVANCE are dropped.
+    """
+    if not articles:
+        return []
+    now = time.time() if now is None else now
+    article_counts = [Counter(tokenize(f"{a['title']} {a.get('description') or ''}")) for a in articles]
+    tweet_counts = [Counter(tokenize(text)) for text in recent_tweets]
+
+    corpus = article_counts + tweet_counts
+    document_frequency = Counter(term for counts in corpus for term in counts)
+    idf = {term: math.log((1 + len(corpus)) / (1 + df)) + 1 for term, df in document_frequency.items()}
+
+    query_vector = _tfidf(Counter(tokenize(query)) + Counter(CRYPTO_TERMS), idf)
+    tweet_vectors = [_tfidf(counts, idf) for counts in tweet_counts]
+    decay = math.log(2) / (NEWS_RANK_HALF_LIFE_HOURS * 3600)
+
+    ranked = []
+    for article, counts in zip(articles, article_counts):
+        vector = _tfidf(counts, idf)
+        published = _published_ts(article.get("published_at"))
+        recency = math.exp(-decay * max(0.0, now - published)) if published else 0.0
+        novelty = 1.0 - max((_cosine(vector, tweet) for tweet in tweet_vectors), default=0.0)
+        if novelty < NEWS_MIN_NOVELTY:
+            logging.debug(f"Skipping article too close to a recent tweet: {article['title']}")
+            continue
+        relevance = _cosine(vector, query_vector)
+        if relevance < NEWS_MIN_RELEVANCE:
+            logging.debug(f"Skipping article unrelated to '{query}': {article['title']}")
+            continue
+        score = (RANK_WEIGHTS["recency"] * recency
+                 + RANK_WEIGHTS["source"] * min(1.0, source_weight(article.get("source")))
+                 + RANK_WEIGHTS["relevance"] * relevance
+                 + RANK_WEIGHTS["novelty"] * novelty)
+        ranked.append((score, article))
+    ranked.sort(key=lambda pair: pair[0], reverse=True)
+    return ranked
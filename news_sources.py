@@ -0,0 +1,270 @@
+import os
+import re
+import logging
+import requests
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from http_cache import cached_get_checked
+from rate_limiter import RateLimited
+import resilience
+from resilience import CircuitOpen
+from database import get_state, set_state
+
+NEWS_RSS_FEEDS = [url.strip() for url in os.getenv("NEWS_RSS_FEEDS", "").split(",") if url.strip()]
+NEWS_JSON_FEEDS = [url.strip() for url in os.getenv("NEWS_JSON_FEEDS", "").split(",") if url.strip()]
+NEWS_SOURCE_TIMEOUT = float(os.getenv("NEWS_SOURCE_TIMEOUT", "10"))
+
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref", "cmpid")
+
+_tag_re = re.compile(r"<[^>]+>")
+
+def canonical_url(url):
+    """
+    Normalizes an article URL so the same story linked with different
+    tracking parameters, fragments or host casing maps to one key.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    params = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower() or "https", host, path, urlencode(params), ""))
+
+def make_article(title, description, url, source, published_at):
+    """
+    Builds the article dict shared by every source, or None if the entry
+    lacks a title or description.
+    """
+    title = _tag_re.sub("", title or "").strip()
+    description = _tag_re.sub("", description or "").strip()
+    if not title or not description:
+        return None
+    return {
+        "title": title,
+        "description": description,
+        "url": url,
+        "url_key": canonical_url(url or title),
+        "source": source,
+        "published_at": published_at
+    }
+
+def _iso_timestamp(value):
+    # RSS uses RFC 822 dates; Atom and JSON feeds already use ISO 8601.
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return parsedate_to_datetime(value).strftime("%Y-%m-%dT%H:%M:%SZ")
+    except (TypeError, ValueError):
+        return value
+
+class NewsSource:
+    """
+    Base class for news sources. fetch() returns a list of article dicts as
+    built by make_article().
+    """
+
+    name = "source"
+    timeout = NEWS_SOURCE_TIMEOUT
+
+    def fetch(self):
+        raise NotImplementedError
+
+class NewsAPISource(NewsSource):
+    """
+    NewsAPI `everything` search. Keeps a per-query publishedAt cursor so each
+    fetch only asks for articles newer than the last one seen.
+    """
+
+    url = "https://newsapi.org/v2/everything"
+
+    def __init__(self, api_key, query="cryptocurrency", language="en", page_size=10, url=None):
+        self.api_key = api_key
+        self.query = query
+        self.language = language
+        self.page_size = page_size
+        self.url = url or self.url
+        self.name = f"newsapi:{query}"
+
+    def _cursor_key(self):
+        return f"news_cursor:{self.language}:{self.query}"
+
+    def fetch(self):
+        params = {
+            "q": self.query,
+            "language": self.language,
+            "sortBy": "publishedAt",
+            "pageSize": self.page_size,
+            "apiKey": self.api_key
+        }
+        cursor = get_state(self._cursor_key())
+        if cursor:
+            params["from"] = cursor
+
+        try:
+            response = resilience.call(
+                "newsapi", cached_get_checked, self.url, params=params,
+                timeout=resilience.call_timeout(self.timeout), bucket="newsapi"
+            )
+            if response.status_code == 429:
+                # cached_get has already closed the bucket for Retry-After.
+                logging.warning("NewsAPI rate limit exceeded, skipping this fetch.")
+                return []
+            response.raise_for_status()
+            data = response.json()
+
+            if data.get("status") != "ok":
+                logging.error(f"Error fetching news: {data.get('message')}")
+                return []
+
+            articles = data.get("articles", [])
+            logging.debug(f"Fetched {len(articles)} news articles since {cursor or 'the beginning'}.")
+            parsed = parse_newsapi_articles(articles)
+            published = [a["published_at"] for a in parsed if a["published_at"]]
+            if published:
+                set_state(self._cursor_key(), max(published))
+            return parsed
+
+        except (RateLimited, CircuitOpen) as e:
+            logging.info(f"Skipping NewsAPI fetch: {e}")
+            return []
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Request exception while fetching news: {e}")
+            return []
+        except ValueError as ve:
+            logging.error(f"JSON decoding failed: {ve}")
+            return []
+
+def parse_newsapi_articles(articles):
+    parsed = []
+    for article in articles:
+        item = make_article(
+            article.get("title"),
+            article.get("description"),
+            article.get("url"),
+            (article.get("source") or {}).get("name"),
+            article.get("publishedAt")
+        )
+        if item:
+            parsed.append(item)
+    return parsed
+
+def _child_text(element, *names):
+    for name in names:
+        child = element.find(name)
+        if child is not None and (child.text or "").strip():
+            return child.text
+    return None
+
+class RSSSource(NewsSource):
+    """
+    RSS 2.0 or Atom feed.
+    """
+
+    ATOM = "{http://www.w3.org/2005/Atom}"
+
+    def __init__(self, url, name=None):
+        self.url = url
+        self.name = name or urlsplit(url).netloc
+
+    def fetch(self):
+        response = resilience.call(f"feed:{self.name}", cached_get_checked, self.url, timeout=resilience.call_timeout(self.timeout))
+        response.raise_for_status()
+        root = ET.fromstring(response.content)
+        articles = []
+        for item in root.iter("item"):
+            articles.append(make_article(
+                _child_text(item, "title"),
+                _child_text(item, "description"),
+                _child_text(item, "link"),
+                self.name,
+                _iso_timestamp(_child_text(item, "pubDate"))
+            ))
+        for entry in root.iter(f"{self.ATOM}entry"):
+            link = entry.find(f"{self.ATOM}link")
+            articles.append(make_article(
+                _child_text(entry, f"{self.ATOM}title"),
+                _child_text(entry, f"{self.ATOM}summary", f"{self.ATOM}content"),
+                link.get("href") if link is not None else None,
+                self.name,
+                _iso_timestamp(_child_text(entry, f"{self.ATOM}published", f"{self.ATOM}updated"))
+            ))
+        return [article for article in articles if article]
+
+class JSONFeedSource(NewsSource):
+    """
+    JSON endpoint returning a list of articles, or an object holding one
+    under "articles" or "items". Field names follow NewsAPI where possible.
+    """
+
+    def __init__(self, url, name=None):
+        self.url = url
+        self.name = name or urlsplit(url).netloc
+
+    def fetch(self):
+        response = resilience.call(f"feed:{self.name}", cached_get_checked, self.url, timeout=resilience.call_timeout(self.timeout))
+        response.raise_for_status()
+        data = response.json()
+        if isinstance(data, dict):
+            data = data.get("articles") or data.get("items") or []
+        articles = []
+        for item in data:
+            source = item.get("source")
+            if isinstance(source, dict):
+                source = source.get("name")
+            articles.append(make_article(
+                item.get("title"),
+                item.get("description") or item.get("summary"),
+                item.get("url") or item.get("link"),
+                source or self.name,
+                _iso_timestamp(item.get("publishedAt") or item.get("published_at"))
+            ))
+        return [article for article in articles if article]
+
+def configured_sources(api_key, query="cryptocurrency", language="en", page_size=10):
+    """
+    Builds the source list from NEWS_API_KEY, NEWS_RSS_FEEDS and
+    NEWS_JSON_FEEDS.
+    """
+    sources = []
+    if api_key:
+        sources.append(NewsAPISource(api_key, query, language, page_size))
+    sources.extend(RSSSource(url) for url in NEWS_RSS_FEEDS)
+    sources.extend(JSONFeedSource(url) for url in NEWS_JSON_FEEDS)
+    return sources
+
+def fetch_all(sources):
+    """
+    Fetches every source concurrently and returns their articles merged and
+    deduplicated by canonical URL, newest first. A source that fails or
+    exceeds its timeout is skipped, so the call takes as long as the slowest
+    source that answers in time.
+    """
+    if not sources:
+        return []
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="news-source")
+    try:
+        futures = {executor.submit(source.fetch): source for source in sources}
+        done, not_done = wait(futures, timeout=max(source.timeout for source in sources))
+        for future in not_done:
+            logging.warning(f"News source {futures[future].name} timed out.")
+        merged = {}
+        for future in done:
+            source = futures[future]
+            try:
+                articles = future.result()
+            except Exception as e:
+                logging.error(f"News source {source.name} failed: {e}")
+                continue
+            logging.debug(f"News source {source.name} returned {len(articles)} articles.")
+            for article in articles:
+                merged.setdefault(article["url_key"], article)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return sorted(merged.values(), key=lambda a: a["published_at"] or "", reverse=True)
@@ -0,0 +1,97 @@
+import os
+import time
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, CancelledError, TimeoutError as FutureTimeout
+from resilience import deadline
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+PIPELINE_BACKGROUND_WORKERS = int(os.getenv("PIPELINE_BACKGROUND_WORKERS", "2"))
+
+# Seconds each step may take, counted from submission. Override one with
+# PIPELINE_TIMEOUT_<STEP>.
+STEP_TIMEOUTS = {
+    "price": 8,
+    "text": 30,
+    "image": 60,
+}
+DEFAULT_STEP_TIMEOUT = 30
+
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+# Steps of background work (the content producer) run here, so they never
+# queue ahead of a post task's steps on the foreground pool.
+_background_executor = ThreadPoolExecutor(max_workers=PIPELINE_BACKGROUND_WORKERS, thread_name_prefix="pipeline-bg")
+atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+atexit.register(_background_executor.shutdown, wait=False, cancel_futures=True)
+
+_background = contextvars.ContextVar("pipeline_background", default=False)
+
+@contextmanager
+def background():
+    """
+    Steps submitted inside the block, and any steps those submit, run on
+    the background pool.
+    """
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+def step_timeout(name):
+    override = os.getenv(f"PIPELINE_TIMEOUT_{name.upper()}")
+    if override:
+        return float(override)
+    return STEP_TIMEOUTS.get(name, DEFAULT_STEP_TIMEOUT)
+
+class Step:
+    """
+    A pipeline step running on the shared pool. result() waits at most
+    until the step's deadline and returns `default` if the step failed,
+    timed out or was cancelled, so a slow optional step (e.g. the image)
+    never holds up the post.
+    """
+
+    def __init__(self, name, future, timeout):
+        self.name = name
+        self.future = future
+        self.deadline = time.monotonic() + timeout
+
+    def result(self, default=None):
+        try:
+            return self.future.result(timeout=max(0.0, self.deadline - time.monotonic()))
+        except FutureTimeout:
+            logging.warning(f"Pipeline step '{self.name}' timed out, continuing without it.")
+            self.future.cancel()
+        except CancelledError:
+            logging.debug(f"Pipeline step '{self.name}' was cancelled.")
+        except Exception as e:
+            logging.error(f"Pipeline step '{self.name}' failed: {e}")
+        return default
+
+    def cancel(self):
+        """
+        Cancels the step if it has not started; a running step finishes in
+        the background and its result is dropped.
+        """
+        if self.future.cancel():
+            logging.debug(f"Pipeline step '{self.name}' cancelled before it started.")
+
+def _run_with_deadline(at, fn, args, kwargs):
+    with deadline(at - time.monotonic()):
+        return fn(*args, **kwargs)
+
+def submit(name, fn, *args, **kwargs):
+    """
+    Starts fn(*args, **kwargs) on the pipeline pool (the background pool
+    inside a background() block) and returns its Step.
+    The step's timeout becomes a resilience deadline inside fn, so HTTP
+    timeouts and retries stop when the step would be abandoned anyway.
+    """
+    timeout = step_timeout(name)
+    context = contextvars.copy_context()
+    executor = _background_executor if _background.get() else _executor
+    future = executor.submit(context.run, _run_with_deadline, time.monotonic() + timeout, fn, args, kwargs)
+    return Step(name, future, timeout)
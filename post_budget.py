@@ -0,0 +1,62 @@
+import os
+import time
+import logging
+import datetime
+import functools
+from dotenv import load_dotenv
+from database import get_counter, reserve_counter, release_counter, reset_counter_if_due
+
+load_dotenv()
+
+MAX_POSTS_PER_DAY = int(os.getenv("MAX_POSTS_PER_DAY", "12"))
+
+POST_COUNTER = "daily_post_count"
+
+def next_midnight_utc():
+    tomorrow = datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=1)
+    midnight = datetime.datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=datetime.UTC)
+    return midnight.timestamp()
+
+def maybe_reset_daily_limit():
+    if reset_counter_if_due(POST_COUNTER, time.time(), next_midnight_utc()):
+        logging.info("Daily post count limit resetting.")
+
+def get_daily_post_count():
+    return get_counter(POST_COUNTER)
+
+def can_post():
+    return get_daily_post_count() < MAX_POSTS_PER_DAY
+
+def reserve_post_slot():
+    """
+    Takes one post from today's budget. Returns False if the budget is spent.
+    """
+    count = reserve_counter(POST_COUNTER, MAX_POSTS_PER_DAY)
+    if count is None:
+        return False
+    logging.debug(f"Reserved post slot {count}/{MAX_POSTS_PER_DAY}.")
+    return True
+
+def release_post_slot():
+    count = release_counter(POST_COUNTER)
+    logging.debug(f"Released post slot, {count}/{MAX_POSTS_PER_DAY} in use.")
+
+def spends_post_slot(task):
+    """
+    Reserves a post slot before running the task, so no OpenAI tokens are
+    spent once the budget is gone, and gives it back if the task returns
+    nothing (i.e. did not post).
+    """
+    @functools.wraps(task)
+    def wrapper(*args, **kwargs):
+        if not reserve_post_slot():
+            logging.info(f"Daily limit reached, skipping {task.__name__}.")
+            return None
+        posted = None
+        try:
+            posted = task(*args, **kwargs)
+        finally:
+            if not posted:
+                release_post_slot()
+        return posted
+    return wrapper
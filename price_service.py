@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import logging
+import threading
+import resilience
+from http_cache import cached_get_checked
+from database import get_coin_prices, put_coin_prices
+
+SIMPLE_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+PRICE_TTL = float(os.getenv("PRICE_TTL", "120"))
+# Older prices are still better than blocking the post path on a request.
+PRICE_MAX_AGE = float(os.getenv("PRICE_MAX_AGE", "3600"))
+PRICE_REFRESH_INTERVAL = float(os.getenv("PRICE_REFRESH_INTERVAL", "120"))
+PRICE_BATCH_SIZE = 100
+
+_prices = {}
+_prices_lock = threading.Lock()
+
+_id_re = re.compile(r"[^a-z0-9]+")
+
+def coin_id(topic):
+    """
+    Maps a topic such as "#Bitcoin" or "Shiba Inu" to a CoinGecko id.
+    """
+    return _id_re.sub("-", topic.lower()).strip("-")
+
+def _remember(prices, fetched_at):
+    with _prices_lock:
+        for key, usd in prices.items():
+            _prices[key] = (usd, fetched_at)
+
+def refresh_prices(topics):
+    """
+    Fetches USD prices for all topics with one /simple/price request per
+    PRICE_BATCH_SIZE ids and stores them in memory and SQLite, stamped with
+    the time CoinGecko was actually asked (older if the HTTP cache served
+    them). Ids that CoinGecko does not know are stored without a price so
+    they are not asked for again until they expire. Returns {coin_id: usd}.
+    """
+    ids = sorted({coin_id(topic) for topic in topics if coin_id(topic)})
+    fetched = {}
+    for start in range(0, len(ids), PRICE_BATCH_SIZE):
+        batch = ids[start:start + PRICE_BATCH_SIZE]
+        response = resilience.call(
+            "coingecko", cached_get_checked, SIMPLE_PRICE_URL,
+            params={"ids": ",".join(batch), "vs_currencies": "usd"},
+            timeout=resilience.call_timeout(5), ttl=PRICE_TTL, bucket="coingecko"
+        )
+        response.raise_for_status()
+        data = response.json()
+        prices = {key: (data.get(key) or {}).get("usd") for key in batch}
+        fetched_at = getattr(response, "fetched_at", None) or time.time()
+        _remember(prices, fetched_at)
+        put_coin_prices(prices, fetched_at)
+        fetched.update(prices)
+    if fetched:
+        logging.debug(f"Refreshed {len(fetched)} coin prices.")
+    return fetched
+
+def _cached(key, max_age):
+    with _prices_lock:
+        cached = _prices.get(key)
+    if cached is None:
+        cached = get_coin_prices([key]).get(key)
+        if cached is not None:
+            _remember({key: cached[0]}, cached[1])
+    if cached is None or time.time() - cached[1] > max_age:
+        return None
+    return cached
+
+def get_prices(topics, fetch_missing=True):
+    """
+    Returns {topic: usd or None}, using cached prices and fetching all the
+    uncached ones in a single batched request if `fetch_missing` is set.
+    Prices older than PRICE_MAX_AGE are never returned.
+    """
+    cached = {topic: _cached(coin_id(topic), PRICE_MAX_AGE) for topic in topics}
+    prices = {topic: entry[0] if entry else None for topic, entry in cached.items()}
+    missing = [topic for topic, entry in cached.items() if entry is None]
+    if missing and fetch_missing:
+        try:
+            refresh_prices(missing)
+            # The HTTP cache may have served a stale response; read back
+            # through the age check rather than trusting the fetch.
+            for topic in missing:
+                entry = _cached(coin_id(topic), PRICE_MAX_AGE)
+                prices[topic] = entry[0] if entry else None
+        except Exception as e:
+            logging.error(f"Error fetching coin prices: {e}")
+    return prices
+
+class PriceRefresher:
+    """
+    Daemon thread that re-fetches prices for `watchlist()` every `interval`
+    seconds, so post tasks read a warm cache.
+    """
+
+    def __init__(self, watchlist, interval=PRICE_REFRESH_INTERVAL):
+        self.watchlist = watchlist
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="price-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                topics = self.watchlist()
+                if topics:
+                    refresh_prices(topics)
+            except Exception as e:
+                logging.error(f"Price refresh failed: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,127 @@
+import os
+import re
+import logging
+import threading
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+PROMPT_MODEL = os.getenv("PROMPT_MODEL", "gpt-4o-mini")
+
+# Input-token budget per style for examples plus the prompt. Override one
+# with PROMPT_TOKEN_BUDGET_<STYLE>, or the fallback with PROMPT_TOKEN_BUDGET.
+PROMPT_TOKEN_BUDGETS = {
+    "tweet": 1200,
+    "reply": 800,
+    "promo": 600,
+}
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1000"))
+
+# Chat formatting overhead: per message, plus the reply primer.
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+_piece_re = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+_stats = {"calls": 0, "input_tokens": 0, "examples_dropped": 0}
+_stats_lock = threading.Lock()
+
+def get_prompt_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        logging.info("tiktoken is not installed, estimating prompt tokens heuristically.")
+        return None
+    try:
+        return tiktoken.encoding_for_model(PROMPT_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """
+    Counts the tokens in `text` with the model's tokenizer, or estimates
+    them when tiktoken is unavailable. Results are cached, since the same
+    examples are counted on every call.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Words of more than ~4 characters usually split, and emoji take
+    # several tokens each; this errs on the high side.
+    pieces = _piece_re.findall(text)
+    return sum(1 + len(piece) // 5 if piece.isascii() else len(piece.encode("utf-8")) // 2 for piece in pieces)
+
+def message_tokens(message):
+    return TOKENS_PER_MESSAGE + count_tokens(message.get("content") or "")
+
+def token_budget(style):
+    override = os.getenv(f"PROMPT_TOKEN_BUDGET_{style.upper()}")
+    if override:
+        return int(override)
+    return PROMPT_TOKEN_BUDGETS.get(style, PROMPT_TOKEN_BUDGET)
+
+def _example_groups(examples):
+    # A group is the system messages and user/assistant turns that belong
+    # together; a new one starts at a system or user message that follows
+    # a turn of the current group, or at a second assistant message, so
+    # lone assistant examples (the database rows) are groups of their own.
+    groups = []
+    for message in examples:
+        role = message.get("role")
+        current = groups[-1] if groups else None
+        if (current is None
+                or (role in ("system", "user") and any(m.get("role") != "system" for m in current))
+                or (role == "assistant" and any(m.get("role") == "assistant" for m in current))):
+            groups.append([message])
+        else:
+            current.append(message)
+    # A question without its answer teaches the model nothing.
+    return [group for group in groups if not any(m.get("role") == "user" for m in group)
+            or group[-1].get("role") == "assistant"]
+
+def build_messages(examples, prompt, style="tweet", budget=None):
+    """
+    Returns (messages, input_tokens) for a chat completion: the prompt last,
+    preceded by as many example groups (system, user and assistant messages
+    that belong together) as fit in the style's token budget. Groups are
+    kept or dropped whole, in the given order; each distinct system message
+    is sent once, first.
+    """
+    budget = token_budget(style) if budget is None else budget
+    prompt_message = {"role": "user", "content": prompt}
+    used = TOKENS_PER_REPLY + message_tokens(prompt_message)
+
+    groups = _example_groups(examples)
+    systems = {}
+    turns = []
+    kept = 0
+    for group in groups:
+        new_systems = {}
+        for message in group:
+            if message.get("role") == "system" and message.get("content") not in systems:
+                new_systems.setdefault(message.get("content"), message)
+        group_turns = [message for message in group if message.get("role") != "system"]
+        cost = sum(message_tokens(message) for message in list(new_systems.values()) + group_turns)
+        if used + cost <= budget:
+            systems.update(new_systems)
+            turns.extend(group_turns)
+            used += cost
+            kept += 1
+
+    dropped = len(groups) - kept
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["input_tokens"] += used
+        _stats["examples_dropped"] += dropped
+    logging.info(f"Prompt for style '{style}': {used}/{budget} input tokens, "
+                 f"{kept} example groups kept, {dropped} dropped.")
+    return list(systems.values()) + turns + [prompt_message], used
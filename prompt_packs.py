@@ -0,0 +1,41 @@
+import os
+import json
+import logging
+from functools import lru_cache
+
+PROMPT_PACK_DIR = os.getenv("PROMPT_PACK_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts"))
+PROMPT_PACK_VERSION = 1
+
+@lru_cache(maxsize=None)
+def load_prompt_pack(style):
+    """
+    Returns the fallback examples for a style from prompts/<style>.json as
+    an immutable tuple of (role, content) pairs. The file is parsed once;
+    later calls return the cached tuple until reload_prompt_packs().
+    """
+    path = os.path.join(PROMPT_PACK_DIR, f"{style}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            pack = json.load(f)
+    except FileNotFoundError:
+        logging.warning(f"No prompt pack for style '{style}' at {path}.")
+        return ()
+    except ValueError as e:
+        logging.error(f"Invalid prompt pack {path}: {e}")
+        return ()
+    if pack.get("version") != PROMPT_PACK_VERSION:
+        logging.error(f"Prompt pack {path} has version {pack.get('version')}, expected {PROMPT_PACK_VERSION}.")
+        return ()
+    messages = tuple((m["role"], m["content"]) for m in pack.get("messages", []) if m.get("content"))
+    logging.debug(f"Loaded {len(messages)} prompt pack examples for style '{style}'.")
+    return messages
+
+def prompt_pack_messages(style):
+    return [{"role": role, "content": content} for role, content in load_prompt_pack(style)]
+
+def reload_prompt_packs():
+    """
+    Drops the parsed packs so the next use re-reads the files.
+    """
+    load_prompt_pack.cache_clear()
+    logging.info("Prompt packs will be reloaded on next use.")
@@ -0,0 +1,126 @@
+import os
+import time
+import logging
+from email.utils import parsedate_to_datetime
+from database import transaction
+
+# Default buckets as (calls, period in seconds). Override any of them with
+# RATE_LIMIT_<NAME>=calls/period, e.g. RATE_LIMIT_TWITTER_POST=17/86400.
+DEFAULT_BUCKETS = {
+    "twitter_post": (17, 24 * 60 * 60),
+    "twitter_media": (17, 24 * 60 * 60),
+    "twitter_mentions": (10, 15 * 60),
+    "twitter_search": (60, 15 * 60),
+    "twitter_users": (25, 24 * 60 * 60),
+    "newsapi": (100, 24 * 60 * 60),
+    "openai": (60, 60),
+    "coingecko": (30, 60),
+}
+
+class RateLimited(Exception):
+    """
+    Raised when a call is skipped because its bucket has no tokens left.
+    """
+
+    def __init__(self, bucket, retry_in):
+        super().__init__(f"Rate limit bucket '{bucket}' is empty, retry in {retry_in:.0f}s.")
+        self.bucket = bucket
+        self.retry_in = retry_in
+
+def _configured_buckets():
+    buckets = {}
+    for name, (calls, period) in DEFAULT_BUCKETS.items():
+        override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+        if override:
+            calls, period = (float(part) for part in override.split("/", 1))
+        buckets[name] = (float(calls), float(period))
+    return buckets
+
+BUCKETS = _configured_buckets()
+
+def _refilled(name, tokens, updated_at, now):
+    capacity, period = BUCKETS[name]
+    return min(capacity, tokens + (now - updated_at) * capacity / period)
+
+def _load(c, name, now):
+    row = c.execute("SELECT tokens, updated_at, blocked_until FROM rate_limits WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return BUCKETS[name][0], 0.0
+    return _refilled(name, row[0], row[1], now), row[2]
+
+def _store(c, name, tokens, blocked_until, now):
+    c.execute("REPLACE INTO rate_limits (name, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+              (name, tokens, now, blocked_until))
+
+def try_acquire(name, tokens=1):
+    """
+    Takes `tokens` from the named bucket if they are available and returns
+    True; returns False immediately otherwise. Never sleeps. Bucket state is
+    kept in SQLite, so it survives restarts and is shared between processes.
+    """
+    now = time.time()
+    with transaction() as c:
+        available, blocked_until = _load(c, name, now)
+        if now < blocked_until or available < tokens:
+            return False
+        _store(c, name, available - tokens, blocked_until, now)
+    return True
+
+def wait_time(name, tokens=1):
+    """
+    Seconds until `tokens` can be taken from the bucket; 0 if they can now.
+    """
+    now = time.time()
+    with transaction() as c:
+        available, blocked_until = _load(c, name, now)
+    capacity, period = BUCKETS[name]
+    refill_wait = max(0.0, (tokens - available) * period / capacity)
+    return max(refill_wait, blocked_until - now, 0.0)
+
+def available(name, tokens=1):
+    return wait_time(name, tokens) == 0
+
+def block(name, seconds):
+    """
+    Empties the bucket and keeps it closed for `seconds`.
+    """
+    now = time.time()
+    with transaction() as c:
+        _, blocked_until = _load(c, name, now)
+        _store(c, name, 0.0, max(blocked_until, now + seconds), now)
+    logging.warning(f"Rate limit bucket '{name}' blocked for {seconds:.0f}s.")
+
+def _retry_after_seconds(value):
+    try:
+        return float(value)
+    except ValueError:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+
+def update_from_headers(name, headers):
+    """
+    Feeds provider rate-limit headers back into the bucket: Retry-After and
+    x-rate-limit-remaining/-reset (Twitter) or x-ratelimit-remaining-requests
+    (OpenAI) can only shrink what the bucket allows, never grow it.
+    """
+    if not headers:
+        return
+    try:
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            block(name, _retry_after_seconds(retry_after))
+            return
+        remaining = headers.get("x-rate-limit-remaining") or headers.get("x-ratelimit-remaining-requests")
+        if remaining is None:
+            return
+        remaining = float(remaining)
+        reset = headers.get("x-rate-limit-reset")
+        if remaining <= 0 and reset:
+            block(name, float(reset) - time.time())
+            return
+        now = time.time()
+        with transaction() as c:
+            tokens, blocked_until = _load(c, name, now)
+            if remaining < tokens:
+                _store(c, name, remaining, blocked_until, now)
+    except (TypeError, ValueError) as e:
+        logging.debug(f"Ignoring unparsable rate-limit headers for '{name}': {e}")
@@ -0,0 +1,182 @@
+import os
+import time
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "120"))
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+
+# Exceptions from the provider SDKs that mean the service (not the request)
+# is at fault, matched by class name so this module needs none of them.
+TRANSIENT_ERROR_NAMES = ("APIConnectionError", "InternalServerError", "TwitterServerError")
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a dependency whose circuit is open.
+    """
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in:.0f}s.")
+        self.name = name
+        self.retry_in = retry_in
+
+class DeadlineExceeded(Exception):
+    pass
+
+class CircuitBreaker:
+    """
+    Per-dependency circuit breaker. After `failure_threshold` consecutive
+    transient failures the circuit opens and calls fail fast for
+    `reset_timeout` seconds; then one trial call is let through (half-open)
+    and its outcome closes or reopens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def retry_in(self):
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def available(self):
+        return self.retry_in() == 0
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() >= self.opened_at + self.reset_timeout:
+                self.state = self.HALF_OPEN
+                logging.info(f"Circuit '{self.name}' half-open, trying one call.")
+                return
+            retry_in = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+        # Open, or half-open with the trial call still running.
+        raise CircuitOpen(self.name, retry_in)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit '{self.name}' closed.")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"Circuit '{self.name}' opened after {self.failures} failures.")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def breaker(name):
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+def available(name):
+    """
+    False while the dependency's circuit is open, so callers (and the
+    scheduler) can skip work that needs it.
+    """
+    return breaker(name).available()
+
+def get_circuit_states():
+    with _breakers_lock:
+        return {name: b.state for name, b in _breakers.items()}
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+@contextmanager
+def deadline(seconds):
+    """
+    Bounds everything run inside the block, including retries and the
+    timeouts passed to HTTP clients via call_timeout(). Nested deadlines
+    can only shorten the outer one.
+    """
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining():
+    at = _deadline.get()
+    return None if at is None else max(0.0, at - time.monotonic())
+
+def call_timeout(default):
+    """
+    Returns `default` capped by the time left before the current deadline.
+    """
+    left = remaining()
+    return default if left is None else max(0.1, min(default, left))
+
+def is_transient(error):
+    """
+    True for connection errors, timeouts and 5xx responses: failures worth a
+    retry that count against the dependency's circuit. Client errors and
+    429s (handled by rate_limiter) are not.
+    """
+    if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status >= 500
+    if error.__cause__ is not None:
+        # SDKs such as tweepy wrap the underlying connection error.
+        return is_transient(error.__cause__)
+    return isinstance(error, (OSError, TimeoutError))
+
+def call(name, fn, *args, attempts=RETRY_ATTEMPTS, **kwargs):
+    """
+    Calls fn through the dependency's circuit breaker. Transient failures
+    are retried up to `attempts` times in total with full-jitter exponential
+    backoff, never sleeping past the current deadline. Raises CircuitOpen
+    without calling fn while the circuit is open, DeadlineExceeded when no
+    time is left, or the last error.
+    """
+    circuit = breaker(name)
+    for attempt in range(attempts):
+        if remaining() == 0:
+            raise DeadlineExceeded(f"Deadline passed before calling '{name}'.")
+        circuit.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                circuit.record_success()
+                raise
+            circuit.record_failure()
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            left = remaining()
+            if attempt + 1 >= attempts or (left is not None and left <= delay) or not circuit.available():
+                raise
+            logging.warning(f"Transient error from '{name}' ({e}), retrying in {delay:.1f}s.")
+            time.sleep(delay)
+            continue
+        circuit.record_success()
+        return result
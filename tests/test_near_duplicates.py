@@ -0,0 +1,64 @@
+import json
+import os
+import re
+
+import pytest
+
+import database
+import near_duplicates
+from near_duplicates import NearDuplicateIndex
+
+PACK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+def pack_tweets():
+    tweets = []
+    for style in ("tweet", "promo"):
+        with open(os.path.join(PACK_DIR, f"{style}.json"), encoding="utf-8") as f:
+            tweets += [m["content"] for m in json.load(f)["messages"] if m["role"] == "assistant"]
+    return tweets
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "bot_state.db"))
+    database.close_db()
+    database.init_db()
+    yield NearDuplicateIndex()
+    database.close_db()
+
+def hashtag_variants(text):
+    hashtags = re.findall(r"#\w+", text)
+    swapped = text.replace(hashtags[-1], "#HODL") if hashtags else text + " #HODL"
+    return [
+        swapped,
+        text + " #HODL",
+        swapped.replace("🚀", "🌕") + " 🔥",
+    ]
+
+def test_one_hashtag_or_emoji_edits_are_near_duplicates(index):
+    tweets = pack_tweets()
+    for text in tweets:
+        index.add(text)
+    for text in tweets:
+        for variant in hashtag_variants(text):
+            assert index.find(variant) is not None, variant
+
+def test_different_tweets_are_not_near_duplicates(index):
+    tweets = pack_tweets()
+    half = len(tweets) // 2
+    for text in tweets[:half]:
+        index.add(text)
+    for text in tweets[half:]:
+        assert index.find(text) is None, text
+
+def test_signature_similarity_tracks_jaccard():
+    text = "Bitcoin breaks above its yearly high as ETF inflows keep climbing #BTC #Crypto"
+    assert near_duplicates.similarity(near_duplicates.minhash(text), near_duplicates.minhash(text)) == 1.0
+    assert near_duplicates.similarity(
+        near_duplicates.minhash(text), near_duplicates.minhash("Ethereum gas fees drop to a two-year low #ETH")
+    ) < 0.3
+
+def test_texts_without_words_are_never_near_duplicates(index):
+    index.add("🚀🚀🚀 https://example.com/a")
+    assert near_duplicates.minhash("🔥 https://other.example/b") is None
+    assert index.find("🔥 https://other.example/b") is None
+    assert index.find("🚀🚀🚀 https://example.com/a") is None
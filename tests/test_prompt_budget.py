@@ -0,0 +1,42 @@
+import pytest
+from prompt_budget import build_messages, token_budget
+from prompt_packs import prompt_pack_messages
+
+@pytest.mark.parametrize("style", ["tweet", "reply", "promo"])
+def test_pack_examples_keep_whole_pairs(style):
+    examples = prompt_pack_messages(style)
+    messages, used = build_messages(examples, "Write something about Bitcoin.", style=style)
+
+    assert used <= token_budget(style)
+    assert messages[-1] == {"role": "user", "content": "Write something about Bitcoin."}
+    roles = [message["role"] for message in messages[:-1]]
+    assert roles.count("system") == 1
+    assert roles[0] == "system"
+    pairs = roles[1:]
+    assert pairs, "no user/assistant example fit the budget"
+    assert pairs == ["user", "assistant"] * (len(pairs) // 2)
+
+def test_groups_are_dropped_whole():
+    examples = [
+        {"role": "system", "content": "persona"},
+        {"role": "user", "content": "short question"},
+        {"role": "assistant", "content": "short answer"},
+        {"role": "system", "content": "persona"},
+        {"role": "user", "content": "another question " * 50},
+        {"role": "assistant", "content": "another answer"},
+        {"role": "user", "content": "dangling question"},
+    ]
+    messages, _ = build_messages(examples, "prompt", budget=60)
+    assert [message["content"] for message in messages] == ["persona", "short question", "short answer", "prompt"]
+
+def test_database_examples_fill_the_budget():
+    # Rows from get_prompt_examples are lone assistant tweets.
+    examples = [
+        {"role": "assistant", "content": f"🗞 Bitcoin news number {i} moves the market today\nDetails of story {i} in a sentence or two.\n@handle"}
+        for i in range(50)
+    ]
+    messages, used = build_messages(examples, "Write something about Bitcoin.", style="tweet")
+
+    assert used <= token_budget("tweet")
+    assert len(messages) > 10
+    assert all(message["role"] == "assistant" for message in messages[:-1])
@@ -0,0 +1,12 @@
+from tweet_length import fit_to_length, weighted_length
+
+def test_cuts_at_whitespace():
+    text = "word " * 100
+    fitted = fit_to_length(text)
+    assert weighted_length(fitted) <= 280
+    assert fitted.endswith("word")
+
+def test_unbroken_text_falls_back_to_last_token():
+    assert fit_to_length("a" * 400) == "a" * 280
+    emoji = fit_to_length("🚀" * 200)
+    assert emoji == "🚀" * 140
@@ -0,0 +1,93 @@
+import re
+
+# Twitter's weighted length (twitter-text v3): most code points count 2,
+# Latin and general punctuation ranges count 1, every URL counts as a t.co
+# link and an emoji sequence counts 2 however many code points it has.
+MAX_TWEET_LENGTH = 280
+TCO_URL_LENGTH = 23
+EMOJI_WEIGHT = 2
+LIGHT_RANGES = ((0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037))
+
+_EMOJI_BASE = "\u00a9\u00ae\u203c\u2049\u2122\u2139\u2194-\u21aa\u2300-\u23ff\u2600-\u27bf\u2b00-\u2bff\U0001f000-\U0001faff"
+_EMOJI_MODIFIERS = "\ufe0f\u20e3\U0001f3fb-\U0001f3ff\U000e0020-\U000e007f"
+_token_re = re.compile(
+    r"(?P<url>https?://\S+)"
+    r"|(?P<emoji>[\U0001f1e6-\U0001f1ff]{2}"
+    rf"|[{_EMOJI_BASE}][{_EMOJI_MODIFIERS}]*(?:\u200d[{_EMOJI_BASE}][{_EMOJI_MODIFIERS}]*)*)"
+    r"|(?P<char>.)",
+    re.DOTALL
+)
+
+def _char_weight(char):
+    code = ord(char)
+    return 1 if any(low <= code <= high for low, high in LIGHT_RANGES) else 2
+
+def weighted_length(text):
+    """
+    Returns the length Twitter counts for `text` against the 280 limit.
+    """
+    length = 0
+    for match in _token_re.finditer(text or ""):
+        if match.lastgroup == "url":
+            length += TCO_URL_LENGTH
+        elif match.lastgroup == "emoji":
+            length += EMOJI_WEIGHT
+        else:
+            length += _char_weight(match.group())
+    return length
+
+def fit_to_length(text, limit=MAX_TWEET_LENGTH):
+    """
+    Returns `text` cut to at most `limit` weighted characters at a clean
+    boundary: the last sentence end that keeps at least half the budget,
+    otherwise the last whitespace, or failing both the end of the last
+    token that fits. URLs and emoji sequences are never split.
+    """
+    text = (text or "").strip()
+    if weighted_length(text) <= limit:
+        return text
+    length = 0
+    last_space = last_sentence = last_token = 0
+    for match in _token_re.finditer(text):
+        token = match.group()
+        if match.lastgroup == "url":
+            length += TCO_URL_LENGTH
+        elif match.lastgroup == "emoji":
+            length += EMOJI_WEIGHT
+        else:
+            length += _char_weight(token)
+        if length > limit:
+            break
+        last_token = match.end()
+        if token.isspace():
+            last_space = match.start()
+            if text[match.start() - 1:match.start()] in ".!?":
+                last_sentence = match.start()
+        elif token in ".!?":
+            last_sentence = match.end()
+    cut = last_sentence if last_sentence and weighted_length(text[:last_sentence]) >= limit // 2 else last_space
+    if not cut:
+        # One unbroken run, e.g. a long word or a chain of emoji.
+        cut = last_token
+    return text[:cut].rstrip(" ,;:-")
+
+class LengthGuard:
+    """
+    Collects streamed text and reports when it has grown past `limit`
+    weighted characters, so the stream can be closed without waiting for
+    the rest of the completion.
+    """
+
+    def __init__(self, limit=MAX_TWEET_LENGTH):
+        self.limit = limit
+        self.parts = []
+
+    def feed(self, delta):
+        """
+        Adds a chunk; returns True once the text exceeds the limit.
+        """
+        self.parts.append(delta)
+        return weighted_length("".join(self.parts)) > self.limit
+
+    def text(self):
+        return fit_to_length("".join(self.parts), self.limit)
@@ -0,0 +1,104 @@
+import os
+import re
+import time
+import logging
+import threading
+import requests
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, wait
+import http_client
+from database import get_url_verdicts, put_url_verdicts
+
+URL_CHECK_TIMEOUT = float(os.getenv("URL_CHECK_TIMEOUT", "5"))
+URL_CHECKS_PER_HOST = int(os.getenv("URL_CHECKS_PER_HOST", "2"))
+URL_VALID_TTL = float(os.getenv("URL_VALID_TTL", str(24 * 60 * 60)))
+URL_INVALID_TTL = float(os.getenv("URL_INVALID_TTL", "600"))
+
+# Per-host (valid, invalid) TTL overrides:
+# URL_VERDICT_TTLS=coindesk.com=86400/3600,t.co=604800/600
+URL_VERDICT_TTLS = {
+    host.strip().lower(): tuple(float(ttl) for ttl in ttls.split("/", 1))
+    for host, _, ttls in (
+        item.partition("=") for item in os.getenv("URL_VERDICT_TTLS", "").split(",") if "=" in item
+    )
+}
+
+# Servers that refuse HEAD answer with one of these; retry with a ranged GET.
+HEAD_REFUSED = (400, 403, 405, 501)
+
+_url_re = re.compile(r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+")
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="url-check")
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+def find_urls(text):
+    return _url_re.findall(text or "")
+
+def _host(url):
+    host = urlsplit(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+def _host_slot(host):
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(URL_CHECKS_PER_HOST)
+        return _host_slots[host]
+
+def verdict_ttl(host, ok):
+    valid_ttl, invalid_ttl = URL_VERDICT_TTLS.get(host, (URL_VALID_TTL, URL_INVALID_TTL))
+    return valid_ttl if ok else invalid_ttl
+
+def check_url(url):
+    """
+    Returns (ok, status) for one URL: HEAD first, following redirects, then
+    a GET for the first byte if the server refuses HEAD. At most
+    URL_CHECKS_PER_HOST checks run against one host at a time.
+    """
+    with _host_slot(_host(url)):
+        try:
+            response = http_client.head(url, timeout=URL_CHECK_TIMEOUT, allow_redirects=True)
+            if response.status_code in HEAD_REFUSED:
+                response = http_client.get(url, timeout=URL_CHECK_TIMEOUT, allow_redirects=True,
+                                        headers={"Range": "bytes=0-0"}, stream=True)
+                response.close()
+        except requests.RequestException as e:
+            logging.debug(f"URL check failed for {url}: {e}")
+            return False, None
+    return response.status_code in (200, 206), response.status_code
+
+def validate_urls(urls):
+    """
+    Returns {url: ok}. Cached verdicts are used as they are; the remaining
+    URLs are checked concurrently over the shared keep-alive client, so the call costs at most one round of
+    requests, and their verdicts are stored with the host's TTL.
+    """
+    urls = list(dict.fromkeys(urls))
+    verdicts = get_url_verdicts(urls)
+    unchecked = [url for url in urls if url not in verdicts]
+    if not unchecked:
+        return verdicts
+
+    futures = {_executor.submit(check_url, url): url for url in unchecked}
+    done, _ = wait(futures, timeout=URL_CHECK_TIMEOUT * 2)
+    rows = []
+    for future, url in futures.items():
+        ok, status = future.result() if future in done else (False, None)
+        verdicts[url] = ok
+        if future in done:
+            host = _host(url)
+            rows.append((url, host, ok, status, time.time() + verdict_ttl(host, ok)))
+        logging.debug(f"URL {url}: {'valid' if ok else 'invalid'} (status {status})")
+    if rows:
+        put_url_verdicts(rows)
+    return verdicts
+
+def has_invalid_url(text):
+    """
+    True if any URL in `text` does not resolve to a 200/206 response.
+    """
+    urls = find_urls(text)
+    if not urls:
+        return False
+    return not all(validate_urls(urls).values())